@@ -0,0 +1,261 @@
+"""
+Replays historical OHLCV through the signal pipeline's validation and
+MARKET/PENDING classification and scores the resulting trades.
+
+    python backtest.py data/BTC_USDT_1h.csv data/ETH_USDT_1h.csv --source rule
+    python backtest.py data/*.csv --source recorded --recorded llm_signals.jsonl
+
+OHLCV files are CSV (timestamp,open,high,low,close,volume; header optional)
+or .npy candle snapshots written by the candle store. The symbol is taken
+from the file name (BTC_USDT_1h.csv -> BTC/USDT).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from indicators import OHLCV_FIELDS, atr, ema, rsi
+from signal_generator import validate_analysis
+
+POSITION_SIZE = 0.1 # Fraction of current equity committed to each trade
+
+# --- Data ---
+def load_ohlcv(path):
+    """Loads an OHLCV file into column arrays (same layout as indicators.candles_to_arrays)."""
+    if path.endswith(".npy"):
+        raw = np.load(path)
+    else:
+        with open(path) as f:
+            first = f.readline()
+        skip = 0 if first[:1].isdigit() else 1
+        raw = np.loadtxt(path, delimiter=",", skiprows=skip, usecols=range(len(OHLCV_FIELDS)), ndmin=2)
+    arrays = {field: np.ascontiguousarray(raw[:, i]) for i, field in enumerate(OHLCV_FIELDS)}
+    arrays["timestamp"] = arrays["timestamp"].astype(np.int64)
+    return arrays
+
+def symbol_from_path(path):
+    parts = os.path.splitext(os.path.basename(path))[0].split("_")
+    return f"{parts[0]}/{parts[1]}" if len(parts) >= 2 else parts[0]
+
+# --- Signal Sources ---
+class RuleBasedSource:
+    """
+    Deterministic stand-in for the LLM: trend-following on the EMA 9/21/50
+    stack with an RSI filter. Buys pull back to EMA21 (so some signals are
+    PENDING), and TP/SL are ATR multiples. Indicators are computed once over
+    the whole series.
+    """
+
+    def __init__(self, tp_atr=2.0, sl_atr=1.0):
+        self.tp_atr = tp_atr
+        self.sl_atr = sl_atr
+
+    def analyze(self, symbol, arrays, indices):
+        close = arrays["close"]
+        fast, mid, slow = ema(close, 9), ema(close, 21), ema(close, 50)
+        rsi_values = rsi(close)
+        atr_values = atr(arrays["high"], arrays["low"], close)
+
+        bullish = (fast > mid) & (mid > slow) & (rsi_values > 50) & (rsi_values < 70)
+        bearish = (fast < mid) & (mid < slow) & (rsi_values < 50) & (rsi_values > 30)
+        analyses = []
+        for i in indices.tolist():
+            if bullish[i]:
+                entry = min(close[i], mid[i])
+                action, tp, sl = "BUY", entry + self.tp_atr * atr_values[i], entry - self.sl_atr * atr_values[i]
+            elif bearish[i]:
+                entry = max(close[i], mid[i])
+                action, tp, sl = "SELL", entry - self.tp_atr * atr_values[i], entry + self.sl_atr * atr_values[i]
+            else:
+                analyses.append(None)
+                continue
+            analyses.append({
+                "action": action, "entry": float(entry), "take_profit": float(tp), "stop_loss": float(sl),
+                "confidence": round(float(abs(rsi_values[i] - 50)) / 20, 2), "reason": "EMA stack with RSI filter",
+            })
+        return analyses
+
+class StubLLMSource:
+    """Canned LLM reply at fixed offsets from the close, formatted like a model would ("$1,234.5")."""
+
+    def __init__(self, action="BUY", entry_offset=0.0, tp_pct=0.02, sl_pct=0.01, confidence=0.75):
+        self.action = action
+        self.entry_offset = entry_offset
+        self.tp_pct = tp_pct
+        self.sl_pct = sl_pct
+        self.confidence = confidence
+
+    def analyze(self, symbol, arrays, indices):
+        side = 1 if self.action == "BUY" else -1
+        analyses = []
+        for price in arrays["close"][indices]:
+            entry = price * (1 - side * self.entry_offset)
+            analyses.append({
+                "action": self.action, "entry": f"${entry:,.2f}",
+                "take_profit": f"${entry * (1 + side * self.tp_pct):,.2f}",
+                "stop_loss": f"${entry * (1 - side * self.sl_pct):,.2f}",
+                "confidence": self.confidence, "reason": "stub",
+            })
+        return analyses
+
+class RecordedSource:
+    """
+    Replays recorded LLM responses from a JSON-lines file; each line holds
+    'symbol', 'timestamp' (of the decision candle) and the raw LLM fields.
+    """
+
+    def __init__(self, path):
+        self.responses = {}
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.responses[(record.pop("symbol"), int(record.pop("timestamp")))] = record
+
+    def analyze(self, symbol, arrays, indices):
+        return [dict(self.responses[key]) if (key := (symbol, int(arrays["timestamp"][i]))) in self.responses else None
+                for i in indices]
+
+# --- Trade Evaluation ---
+def evaluate_trades(arrays, idx, side, entry, take_profit, stop_loss, market, horizon):
+    """
+    Vectorised fill/TP/SL evaluation over the `horizon` bars after each signal.
+    MARKET signals fill at entry on the signal bar; PENDING ones on the first
+    bar that trades through entry. When TP and SL fall in the same bar the SL
+    is assumed to hit first. Trades still open at the horizon are closed at
+    the last close. Returns per-trade (filled, outcome, exit_bar, return)
+    where outcome is 1 for TP, -1 for SL and 0 for timeout.
+    """
+    n = len(idx)
+    pad = np.full(horizon, np.nan)
+    high = sliding_window_view(np.concatenate((arrays["high"], pad)), horizon)[idx + 1]
+    low = sliding_window_view(np.concatenate((arrays["low"], pad)), horizon)[idx + 1]
+    close = sliding_window_view(np.concatenate((arrays["close"], pad)), horizon)[idx + 1]
+    bars = np.arange(horizon)
+    is_buy = (side > 0)[:, None]
+
+    touched = np.where(is_buy, low <= entry[:, None], high >= entry[:, None])
+    fill_bar = np.where(market, 0, np.where(touched.any(axis=1), touched.argmax(axis=1), horizon))
+    filled = fill_bar < horizon
+    active = bars[None, :] >= fill_bar[:, None]
+
+    tp_hit = active & np.where(is_buy, high >= take_profit[:, None], low <= take_profit[:, None])
+    sl_hit = active & np.where(is_buy, low <= stop_loss[:, None], high >= stop_loss[:, None])
+    tp_bar = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), horizon)
+    sl_bar = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), horizon)
+
+    outcome = np.where(sl_bar <= tp_bar, np.where(sl_bar < horizon, -1, 0), 1)
+    # Close timeouts at the last bar with data (the series may end inside the horizon).
+    last_valid = np.maximum((~np.isnan(close)).sum(axis=1) - 1, 0)
+    timeout_price = close[np.arange(n), last_valid]
+    exit_price = np.select([outcome == 1, outcome == -1], [take_profit, stop_loss], timeout_price)
+    exit_bar = idx + 1 + np.select([outcome == 1, outcome == -1], [tp_bar, sl_bar], last_valid)
+    returns = np.where(filled, side * (exit_price - entry) / entry, 0.0)
+    return filled, np.where(filled, outcome, 0), exit_bar, returns
+
+# --- Backtest ---
+def backtest_symbol(symbol, arrays, source, horizon=48, step=1, warmup=50):
+    """Runs one symbol through source -> validate_analysis -> evaluate_trades."""
+    indices = np.arange(warmup, len(arrays["close"]) - 1, step)
+    analyses = source.analyze(symbol, arrays, indices)
+
+    rejected = {}
+    holds = 0
+    trades = []
+    closes = arrays["close"].tolist()
+    for i, analysis in zip(indices.tolist(), analyses):
+        if analysis is None:
+            continue
+        signal = validate_analysis(analysis, closes[i])
+        if "error" in signal:
+            rejected[signal["error"]] = rejected.get(signal["error"], 0) + 1
+        elif signal["action"] not in ("BUY", "SELL"):
+            holds += 1
+        else:
+            trades.append((i, 1 if signal["action"] == "BUY" else -1, signal["entry"], signal["take_profit"],
+                           signal["stop_loss"], signal["signal_type"] == "MARKET"))
+
+    result = {"symbol": symbol, "decisions": len(indices), "holds": holds, "rejected": rejected, "signals": len(trades)}
+    if not trades:
+        return result, np.empty(0), np.empty(0, dtype=np.int64)
+    idx, side, entry, tp, sl, market = (np.array(column) for column in zip(*trades))
+    filled, outcome, exit_bar, returns = evaluate_trades(arrays, idx, side, entry, tp, sl, market, horizon)
+    result.update({
+        "market": int(market.sum()),
+        "pending": int((~market).sum()),
+        "filled": int(filled.sum()),
+        "wins": int((outcome == 1).sum()),
+        "losses": int((outcome == -1).sum()),
+        "timeouts": int((filled & (outcome == 0)).sum()),
+    })
+    exit_times = arrays["timestamp"][np.minimum(exit_bar, len(arrays["timestamp"]) - 1)]
+    return result, returns[filled], exit_times[filled]
+
+def summarize(returns, exit_times, position_size=POSITION_SIZE):
+    """
+    Win rate, expectancy, compounded return and max drawdown over all filled
+    trades. The equity curve commits `position_size` of current equity to each
+    trade in exit order, so overlapping trades do not add up to more than the
+    account holds.
+    """
+    if returns.size == 0:
+        return {"trades": 0}
+    equity = np.cumprod(1.0 + position_size * returns[np.argsort(exit_times, kind="stable")])
+    peak = np.maximum.accumulate(np.concatenate(([1.0], equity)))[1:]
+    drawdown = 1.0 - equity / peak
+    wins = returns > 0
+    return {
+        "trades": int(returns.size),
+        "win_rate": round(float(wins.mean()), 4),
+        "expectancy_pct": round(float(returns.mean() * 100), 4),
+        "avg_win_pct": round(float(returns[wins].mean() * 100), 4) if wins.any() else 0.0,
+        "avg_loss_pct": round(float(returns[~wins].mean() * 100), 4) if (~wins).any() else 0.0,
+        "position_size": position_size,
+        "total_return_pct": round(float((equity[-1] - 1.0) * 100), 2),
+        "max_drawdown_pct": round(float(drawdown.max() * 100), 2),
+    }
+
+def run_backtest(paths, source, horizon=48, step=1, warmup=50, position_size=POSITION_SIZE):
+    started = time.perf_counter()
+    per_symbol, all_returns, all_exits = [], [], []
+    bars = 0
+    for path in paths:
+        arrays = load_ohlcv(path)
+        bars += len(arrays["close"])
+        result, returns, exits = backtest_symbol(symbol_from_path(path), arrays, source, horizon, step, warmup)
+        result.update(summarize(returns, exits, position_size))
+        per_symbol.append(result)
+        all_returns.append(returns)
+        all_exits.append(exits)
+    summary = (summarize(np.concatenate(all_returns), np.concatenate(all_exits), position_size)
+               if paths else {"trades": 0})
+    summary.update({"symbols": len(paths), "bars": bars, "seconds": round(time.perf_counter() - started, 3)})
+    return {"summary": summary, "symbols": per_symbol}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="OHLCV files (.csv or .npy)")
+    parser.add_argument("--source", choices=("rule", "stub", "recorded"), default="rule")
+    parser.add_argument("--recorded", help="JSON-lines file of recorded LLM responses (for --source recorded)")
+    parser.add_argument("--horizon", type=int, default=48, help="Bars a trade may stay open")
+    parser.add_argument("--step", type=int, default=1, help="Evaluate a signal every N bars")
+    parser.add_argument("--position-size", type=float, default=POSITION_SIZE,
+                        help="Fraction of equity per trade for the return and drawdown figures")
+    args = parser.parse_args()
+
+    if args.source == "recorded":
+        if not args.recorded:
+            sys.exit("--source recorded needs --recorded <file>")
+        source = RecordedSource(args.recorded)
+    elif args.source == "stub":
+        source = StubLLMSource()
+    else:
+        source = RuleBasedSource()
+    print(json.dumps(run_backtest(args.files, source, args.horizon, args.step, position_size=args.position_size), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Multi-timeframe data: one fetch of the finest timeframe resampled locally
+versus a separate Binance fetch per timeframe. Both paths end up with the same
+bars: the separate fetches ask for as many bars per timeframe as resampling
+produced. Reports exchange calls, wall time, bar counts and the resample cost
+per symbol.
+
+Offline (default) the exchange is the FakeExchange stand-in. With --live the
+real Binance bars are also compared with the resampled ones, as a check that
+the resampler reproduces the exchange's own aggregation.
+
+    python benchmarks/bench_mtf.py --symbols 20
+    python benchmarks/bench_mtf.py --live --symbols 3 --timeframes 1h,4h,1d
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import binance_api
+import signal_generator
+from candle_store import CANDLE_STORE_CAPACITY, timeframe_to_ms
+from indicators import OHLCV_FIELDS, candles_to_arrays, resample_ohlcv
+
+from fakes import FakeExchange, install_fake_exchange
+
+LIVE_SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "BNB/USDT", "XRP/USDT", "ADA/USDT", "DOGE/USDT", "AVAX/USDT"]
+
+def to_arrays(rows):
+    return candles_to_arrays([dict(zip(OHLCV_FIELDS, row)) for row in rows])
+
+async def fetch_separately(symbols, timeframes, limits):
+    """One REST call per (symbol, timeframe) for `limits[timeframe]` bars, all in flight together."""
+    rows = await asyncio.gather(*(binance_api.fetch_ohlcv(s, tf, limit=limits[tf]) for s in symbols for tf in timeframes))
+    it = iter(rows)
+    return {s: {tf: next(it) for tf in timeframes} for s in symbols}
+
+async def fetch_and_resample(symbols, timeframes, limit):
+    """One REST call per symbol for the finest timeframe; the rest are built locally."""
+    source = timeframes[0]
+    rows = await asyncio.gather(*(binance_api.fetch_ohlcv(s, source, limit=limit) for s in symbols))
+    frames, resample_seconds = {}, 0.0
+    for symbol, symbol_rows in zip(symbols, rows):
+        arrays = to_arrays(symbol_rows)
+        started = time.perf_counter()
+        frames[symbol] = {source: arrays, **{
+            tf: resample_ohlcv(arrays, timeframe_to_ms(source), timeframe_to_ms(tf)) for tf in timeframes[1:]
+        }}
+        resample_seconds += time.perf_counter() - started
+    return frames, resample_seconds
+
+def compare_bars(resampled, fetched):
+    """Largest relative OHLCV difference over the closed bars both sides have."""
+    fetched = to_arrays(fetched)
+    common, ours, theirs = np.intersect1d(resampled["timestamp"][:-1], fetched["timestamp"][:-1], return_indices=True)
+    if common.size == 0:
+        return {"bars": 0}
+    diffs = {
+        field: float(np.max(np.abs(resampled[field][ours] / fetched[field][theirs] - 1)))
+        for field in ("open", "high", "low", "close", "volume")
+    }
+    return {"bars": int(common.size), "max_rel_diff": diffs}
+
+async def run(args):
+    timeframes = sorted(args.timeframes.split(","), key=timeframe_to_ms)
+    if args.live:
+        symbols = LIVE_SYMBOLS[:args.symbols]
+    else:
+        symbols = [f"C{i:03d}/USDT" for i in range(args.symbols)]
+        install_fake_exchange(FakeExchange(symbols, latency=args.latency, jitter=args.jitter))
+    exchange = await binance_api.exchange_manager.get_exchange()
+    limit = args.limit
+
+    def calls():
+        return getattr(exchange, "calls", None)
+
+    def bar_counts(data):
+        return {tf: int(data[symbols[0]][tf]["timestamp"].size) for tf in timeframes}
+
+    separate, local, resample_us = [], [], []
+    separate_calls = local_calls = None
+    for _ in range(args.runs):
+        before = calls()
+        started = time.perf_counter()
+        frames, resample_seconds = await fetch_and_resample(symbols, timeframes, limit)
+        local.append(time.perf_counter() - started)
+        local_calls = calls() - before if before is not None else len(symbols)
+        resample_us.append(resample_seconds / len(symbols) * 1e6)
+
+        # Fetch the bars resampling produced (~limit/4 at 4h, ~limit/24 at 1d), not `limit` of each.
+        before = calls()
+        started = time.perf_counter()
+        fetched = await fetch_separately(symbols, timeframes, bar_counts(frames))
+        separate.append(time.perf_counter() - started)
+        separate_calls = calls() - before if before is not None else len(symbols) * len(timeframes)
+
+    report = {
+        "symbols": len(symbols),
+        "timeframes": timeframes,
+        "source_bars": limit,
+        "separate": {"calls": separate_calls, "seconds_p50": round(statistics.median(separate), 4),
+                     "bars": {tf: len(rows) for tf, rows in fetched[symbols[0]].items()}},
+        "resampled": {"calls": local_calls, "seconds_p50": round(statistics.median(local), 4),
+                      "resample_us_per_symbol": round(statistics.median(resample_us), 1),
+                      "bars": bar_counts(frames)},
+    }
+    if args.live:
+        report["check"] = {
+            symbol: {tf: compare_bars(frames[symbol][tf], fetched[symbol][tf]) for tf in timeframes[1:]}
+            for symbol in symbols
+        }
+
+    # Per-signal cost of the mtf prompt data: resampling plus all indicators.
+    source = frames[symbols[0]][timeframes[0]]
+    started = time.perf_counter()
+    for _ in range(100):
+        signal_generator.multi_timeframe_features(source, float(source["close"][-1]), timeframes)
+    report["mtf_features_ms"] = round((time.perf_counter() - started) / 100 * 1000, 3)
+    await binance_api.exchange_manager.close()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Use Binance instead of the fake exchange")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--timeframes", default="1h,4h,1d", help="Comma-separated, must include 1h; the finest is fetched")
+    parser.add_argument("--limit", type=int, default=CANDLE_STORE_CAPACITY, help="Bars of the finest timeframe fetched")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.08, help="Fake exchange latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.04, help="Fake exchange latency jitter (s)")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
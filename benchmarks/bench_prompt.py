@@ -0,0 +1,132 @@
+"""
+Compares the raw-candle prompt with the local indicator summary: prompt size,
+estimated prompt tokens (split into the fixed system prompt and the market
+data in the user message), and end-to-end get_trading_signal time.
+
+Offline (default) the exchange and Groq are replaced by stand-ins; the fake
+LLM's latency grows with prompt size (--prefill-tps) so the effect of a
+smaller prompt shows up in the timings. Pass --live to hit Binance and Groq
+for real (needs GROQ_API_KEY and reports the API's own token counts).
+
+    python benchmarks/bench_prompt.py --runs 20
+    python benchmarks/bench_prompt.py --live --symbol ETH/USDT --runs 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import groq_agent
+import signal_generator
+from indicators import candles_to_arrays, compute_features
+from signal_cache import SignalCache
+
+from fakes import FakeCompletions, install_fake_llm
+
+def synthetic_candles(limit, start_price=60000.0, seed=1):
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.004, limit)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    spread = close * rng.uniform(0.001, 0.006, limit)
+    return [
+        {"timestamp": 1_700_000_000_000 + i * 3_600_000, "open": float(o), "high": float(max(o, c) + s),
+         "low": float(min(o, c) - s), "close": float(c), "volume": float(v)}
+        for i, (o, c, s, v) in enumerate(zip(open_, close, spread, rng.uniform(50, 500, limit)))
+    ]
+
+def install_offline_stubs(args):
+    candles = synthetic_candles(200)
+
+    async def fake_get_candles(symbol='BTC/USDT', time_frame='1h', limit=50):
+        return candles[-limit:]
+
+    async def fake_get_candle_arrays(symbol='BTC/USDT', time_frame='1h', limit=50):
+        return candles_to_arrays(candles[-limit:])
+
+    async def fake_get_current_price(symbol='BTC/USDT', max_retries=3):
+        return candles[-1]["close"]
+
+    signal_generator.get_candles = fake_get_candles
+    signal_generator.get_candle_arrays = fake_get_candle_arrays
+    signal_generator.get_current_price = fake_get_current_price
+    install_fake_llm(FakeCompletions(args.base_latency, args.prefill_tps))
+    return candles
+
+def prompt_sizes(candles):
+    price = candles[-1]["close"]
+    raw = groq_agent.build_messages(candles[-signal_generator.CANDLE_LIMITS["raw"]:], price)
+    features = compute_features(candles_to_arrays(candles[-signal_generator.CANDLE_LIMITS["features"]:]), price)
+    compact = groq_agent.build_messages(features, price)
+
+    start = time.perf_counter()
+    for _ in range(100):
+        compute_features(candles_to_arrays(candles[-signal_generator.CANDLE_LIMITS["features"]:]), price)
+    feature_ms = (time.perf_counter() - start) / 100 * 1000
+
+    def size(messages):
+        # The system prompt is fixed per mode; only the user part scales with the market data.
+        system = [m for m in messages if m["role"] == "system"]
+        user = [m for m in messages if m["role"] != "system"]
+        return {"chars": sum(len(m["content"]) for m in messages), "est_tokens": groq_agent.estimate_tokens(messages),
+                "system_tokens": groq_agent.estimate_tokens(system), "user_tokens": groq_agent.estimate_tokens(user)}
+
+    return {"raw": size(raw), "features": size(compact), "feature_compute_ms": round(feature_ms, 3)}
+
+async def time_signals(symbol, runs):
+    results = {}
+    # Every run should reach the LLM, so keep coalescing but cache nothing.
+    signal_generator.signal_cache = SignalCache(ttl=0)
+    for mode in ("raw", "features"):
+        signal_generator.PROMPT_MODE = mode
+        tokens_before = groq_agent.llm_limiter.stats["tokens"]
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            signal = await signal_generator.get_trading_signal(symbol)
+            timings.append(time.perf_counter() - start)
+            if "error" in signal:
+                print(f"[{mode}] error: {signal['error']}", file=sys.stderr)
+        results[mode] = {
+            "runs": runs,
+            "mean_s": round(statistics.mean(timings), 3),
+            "median_s": round(statistics.median(timings), 3),
+            "api_tokens_per_call": (groq_agent.llm_limiter.stats["tokens"] - tokens_before) // runs,
+        }
+    return results
+
+async def run(args):
+    if args.live:
+        candles = await signal_generator.get_candles(args.symbol, limit=200)
+        if "error" in candles:
+            sys.exit(candles["error"])
+    else:
+        candles = install_offline_stubs(args)
+    report = {"mode": "live" if args.live else "offline", "prompt": prompt_sizes(candles)}
+    report["get_trading_signal"] = await time_signals(args.symbol, args.runs)
+    raw_tokens = report["prompt"]["raw"]["est_tokens"]
+    report["prompt"]["reduction_x"] = round(raw_tokens / report["prompt"]["features"]["est_tokens"], 1)
+    report["prompt"]["user_reduction_x"] = round(report["prompt"]["raw"]["user_tokens"]
+                                                 / report["prompt"]["features"]["user_tokens"], 1)
+    if args.live:
+        from binance_api import close_exchange
+        await close_exchange()
+    print(json.dumps(report, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Use the real Binance and Groq APIs")
+    parser.add_argument("--symbol", default="BTC/USDT")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--base-latency", type=float, default=0.3, help="Fake LLM fixed latency in seconds")
+    parser.add_argument("--prefill-tps", type=float, default=2000.0, help="Fake LLM prompt tokens processed per second")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Offline load benchmarks for the bot's hot paths, against a fake exchange, a
+fake LLM and a fake Telegram bot with configurable latency and failure rates:
+
+  signal     get_trading_signal latency (p50/p90/p99) under concurrent requests
+  monitor    monitor_pending_signals passes over many pending entries and symbols
+  scan       scan_market over a ranked universe, cold and warm candle cache
+  broadcast  MessageDispatcher fan-out rate to many chats
+  priority   interactive get_trading_signal latency while background signals compete for scheduler slots
+
+Results are written as JSON so runs can be diffed between versions:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+    python benchmarks/bench_suite.py --only monitor --pending 10000 --symbols 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import binance_api
+import groq_agent
+import market_scanner
+import signal_generator
+from message_dispatcher import MessageDispatcher
+from metrics import SCHEDULER_WAIT_SECONDS
+from price_triggers import PriceTriggerIndex
+from signal_cache import SignalCache
+from work_scheduler import PRIORITIES, WorkScheduler
+
+from fakes import FakeBot, FakeCompletions, FakeExchange, install_fake_exchange, install_fake_llm
+
+BENCHMARKS = ("signal", "monitor", "scan", "broadcast", "priority")
+
+def make_symbols(count, quote="USDT"):
+    return [f"C{i:04d}/{quote}" for i in range(count)]
+
+def latency_summary(samples):
+    values = np.array(samples)
+    return {
+        "count": int(values.size),
+        "mean_s": round(float(values.mean()), 4),
+        "p50_s": round(float(np.percentile(values, 50)), 4),
+        "p90_s": round(float(np.percentile(values, 90)), 4),
+        "p99_s": round(float(np.percentile(values, 99)), 4),
+        "max_s": round(float(values.max()), 4),
+    }
+
+def reset_candle_store():
+    # Each benchmark starts from a cold candle cache.
+    binance_api.candle_store._buffers.clear()
+    binance_api.candle_store._locks.clear()
+
+# --- Benchmarks ---
+async def bench_signal(args, exchange, llm):
+    """Concurrent get_trading_signal calls; the signal cache is disabled so every call reaches the LLM."""
+    reset_candle_store()
+    signal_generator.signal_cache = SignalCache(ttl=0)
+    symbols = list(exchange.markets)[:args.signal_symbols]
+    semaphore = asyncio.Semaphore(args.signal_concurrency)
+    timings, errors = [], 0
+    calls_before, chars_before = llm.calls, llm.completion_chars
+
+    async def one(symbol):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            signal = await signal_generator.get_trading_signal(symbol)
+            timings.append(time.perf_counter() - start)
+            errors += "error" in signal
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(symbols[i % len(symbols)]) for i in range(args.signal_runs)))
+    elapsed = time.perf_counter() - started
+    return {
+        **latency_summary(timings),
+        "concurrency": args.signal_concurrency,
+        "errors": errors,
+        "llm_calls": llm.calls - calls_before,
+        "llm_calls_per_signal": round((llm.calls - calls_before) / len(timings), 2),
+        "completion_chars_per_signal": round((llm.completion_chars - chars_before) / len(timings)),
+        "streaming": groq_agent.LLM_STREAMING,
+        "hedge_after_s": signal_generator.LLM_HEDGE_AFTER,
+        "signals_per_second": round(len(timings) / elapsed, 2),
+    }
+
+async def bench_monitor(args, exchange, llm):
+    """Runs monitor_pending_signals passes over pending entries spread around each symbol's price."""
+    # Imported here so the other benchmarks do not need the Telegram handlers.
+    import telegram_bot
+    from signal_store import signal_store
+
+    reset_candle_store()
+    signal_generator.signal_cache = SignalCache()
+    telegram_bot.PRICE_FEED = 'poll'
+    index = telegram_bot.pending_signals = PriceTriggerIndex()
+
+    rng = random.Random(3)
+    symbols = list(exchange.markets)[:args.symbols]
+    for i in range(args.pending):
+        symbol = symbols[i % len(symbols)]
+        price = exchange.prices[symbol]
+        distance = rng.uniform(args.min_distance, args.max_distance)
+        action = rng.choice(("BUY", "SELL"))
+        entry = price * (1 - distance) if action == "BUY" else price * (1 + distance)
+        index.add({"chat_id": 1000 + i, "symbol": symbol, "action": action, "entry": entry})
+
+    dispatcher = telegram_bot.message_dispatcher
+    await dispatcher.start(FakeBot(latency=args.bot_latency))
+    pass_times, checked, triggered = [], 0, 0
+    calls_before = llm.calls
+    try:
+        for _ in range(args.passes):
+            exchange.step_prices(args.volatility)
+            before = len(index)
+            start = time.perf_counter()
+            await telegram_bot.monitor_pending_signals(None)
+            pass_times.append(time.perf_counter() - start)
+            checked += before
+            triggered += before - len(index)
+    finally:
+        await dispatcher.stop(drain_timeout=5)
+        signal_store._writes.clear()
+    return {
+        "pending": args.pending,
+        "symbols": len(symbols),
+        "pass": latency_summary(pass_times),
+        "triggered": triggered,
+        "llm_calls": llm.calls - calls_before,
+        "checks_per_second": round(checked / sum(pass_times), 1),
+    }
+
+async def bench_scan(args, exchange, llm):
+    """Full scan_market runs over the volume-ranked universe: the first from a cold candle cache."""
+    reset_candle_store()
+    signal_generator.signal_cache = SignalCache(ttl=0)
+    market_scanner._universe_cache = (0.0, None)
+    market_scanner.SCAN_UNIVERSE_SIZE = args.universe
+    runs = []
+    for _ in range(args.scan_runs):
+        exchange.step_prices(args.volatility)
+        report = await market_scanner.scan_market(concurrency=args.scan_concurrency)
+        runs.append(report["timings"])
+    return {
+        "universe": args.universe,
+        "concurrency": args.scan_concurrency,
+        "cold": runs[0],
+        "warm": {stage: round(float(np.mean([run[stage] for run in runs[1:]])), 3) for stage in runs[0]} if len(runs) > 1 else None,
+    }
+
+async def bench_priority(args, exchange, llm):
+    """
+    Interactive requests from several users arrive at a steady rate while
+    `background_load` background signals run back to back; reports the
+    interactive latency and the scheduler's queue wait per class.
+    """
+    reset_candle_store()
+    signal_generator.signal_cache = SignalCache(ttl=0)
+    signal_generator.work_scheduler = WorkScheduler(concurrency=args.scheduler_concurrency,
+                                                    background_slots=args.scheduler_background_slots)
+    SCHEDULER_WAIT_SECONDS.values.clear()
+    symbols = list(exchange.markets)
+    stopping = False
+    background_signals = 0
+
+    async def background(worker):
+        nonlocal background_signals
+        i = worker
+        while not stopping:
+            signal = await signal_generator.get_trading_signal(symbols[i % len(symbols)], priority="background")
+            if "error" in signal:
+                await asyncio.sleep(0.05) # Refused: back off like a scan would until its next run
+            else:
+                background_signals += 1
+            i += args.background_load
+
+    timings, busy = [], 0
+
+    async def interactive(i):
+        nonlocal busy
+        start = time.perf_counter()
+        signal = await signal_generator.get_trading_signal(symbols[-1 - i % 20], priority="interactive", user=i % 10)
+        timings.append(time.perf_counter() - start)
+        busy += "error" in signal
+
+    workers = [asyncio.create_task(background(worker)) for worker in range(args.background_load)]
+    await asyncio.sleep(args.llm_latency) # Let the background work take its slots first
+    requests = []
+    for i in range(args.interactive_runs):
+        requests.append(asyncio.create_task(interactive(i)))
+        await asyncio.sleep(args.interactive_interval)
+    await asyncio.gather(*requests)
+    stopping = True
+    await asyncio.gather(*workers)
+
+    waits = {}
+    for priority in PRIORITIES:
+        summary = SCHEDULER_WAIT_SECONDS.summary(priority=priority)
+        if summary:
+            waits[priority] = {"count": summary["count"], "mean_s": round(summary["mean"], 4), "p95_s": round(summary["p95"], 4)}
+    signal_generator.work_scheduler = WorkScheduler()
+    return {
+        "scheduler_concurrency": args.scheduler_concurrency,
+        "background_slots": args.scheduler_background_slots,
+        "background_load": args.background_load,
+        "interactive": latency_summary(timings),
+        "interactive_busy": busy,
+        "background_signals": background_signals,
+        "queue_wait": waits,
+    }
+
+async def bench_broadcast(args, exchange, llm):
+    """Time to deliver one message to `chats` chats through a fresh dispatcher."""
+    bot = FakeBot(latency=args.bot_latency)
+    dispatcher = MessageDispatcher(global_rate=args.dispatch_rate)
+    await dispatcher.start(bot)
+    start = time.perf_counter()
+    queued = dispatcher.broadcast(range(args.chats), "benchmark")
+    while dispatcher.stats["sent"] + dispatcher.stats["failed"] < queued:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    await dispatcher.stop(drain_timeout=0)
+    return {
+        "chats": args.chats,
+        "global_rate_limit": args.dispatch_rate,
+        "workers": dispatcher.workers,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(dispatcher.stats["sent"] / elapsed, 2),
+    }
+
+# --- Reporting ---
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def flatten(data, prefix=""):
+    """{'a': {'b': 1}} -> {'a.b': 1}, keeping only numeric leaves."""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(report, baseline):
+    """Prints the relative change of every numeric result shared with `baseline`."""
+    current, previous = flatten(report["results"]), flatten(baseline["results"])
+    print(f"Compared with {baseline.get('version') or 'baseline'}:", file=sys.stderr)
+    for name in sorted(current.keys() & previous.keys()):
+        if previous[name]:
+            change = (current[name] - previous[name]) / abs(previous[name]) * 100
+            print(f"  {name:<40} {previous[name]:>12} -> {current[name]:<12} ({change:+.1f}%)", file=sys.stderr)
+
+async def run(args):
+    symbol_count = max(args.universe, args.symbols, args.signal_symbols)
+    exchange = FakeExchange(make_symbols(symbol_count), latency=args.exchange_latency,
+                            jitter=args.exchange_jitter, failure_rate=args.exchange_failure_rate)
+    llm = FakeCompletions(base_latency=args.llm_latency, prefill_tps=args.prefill_tps,
+                          failure_rate=args.llm_failure_rate, tail_rate=args.llm_tail_rate,
+                          tail_latency=args.llm_tail_latency, invalid_rate=args.llm_invalid_rate,
+                          decode_tps=args.llm_decode_tps, reasoning_chars=args.llm_reasoning_chars,
+                          trailing_chars=args.llm_trailing_chars)
+    install_fake_exchange(exchange)
+    install_fake_llm(llm)
+    groq_agent.LLM_STREAMING = args.llm_streaming
+    if args.hedge_after is not None:
+        signal_generator.LLM_HEDGE_AFTER = args.hedge_after
+
+    benchmarks = {"signal": bench_signal, "monitor": bench_monitor, "scan": bench_scan, "broadcast": bench_broadcast,
+                  "priority": bench_priority}
+    results = {}
+    for name in args.only or BENCHMARKS:
+        start = time.perf_counter()
+        results[name] = await benchmarks[name](args, exchange, llm)
+        print(f"{name}: done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    return {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Run only these benchmarks")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Earlier JSON report to print relative changes against")
+    fakes = parser.add_argument_group("fakes")
+    fakes.add_argument("--exchange-latency", type=float, default=0.05)
+    fakes.add_argument("--exchange-jitter", type=float, default=0.02)
+    fakes.add_argument("--exchange-failure-rate", type=float, default=0.0)
+    fakes.add_argument("--llm-latency", type=float, default=0.3)
+    fakes.add_argument("--prefill-tps", type=float, default=2000.0, help="Fake LLM prompt tokens processed per second")
+    fakes.add_argument("--llm-failure-rate", type=float, default=0.0)
+    fakes.add_argument("--llm-tail-rate", type=float, default=0.0, help="Share of LLM replies delayed by --llm-tail-latency")
+    fakes.add_argument("--llm-tail-latency", type=float, default=5.0)
+    fakes.add_argument("--llm-invalid-rate", type=float, default=0.0, help="Share of first LLM answers with TP/SL swapped")
+    fakes.add_argument("--llm-decode-tps", type=float, default=0.0, help="Fake LLM completion tokens per second (0: instant)")
+    fakes.add_argument("--llm-reasoning-chars", type=int, default=0, help="<think> output before the JSON")
+    fakes.add_argument("--llm-trailing-chars", type=int, default=0, help="Text the model adds after the JSON")
+    fakes.add_argument("--llm-streaming", action="store_true", help="Stream completions (LLM_STREAMING)")
+    fakes.add_argument("--bot-latency", type=float, default=0.03, help="Fake Telegram send_message latency")
+    fakes.add_argument("--volatility", type=float, default=0.001, help="Price random-walk step per pass")
+    load = parser.add_argument_group("load")
+    load.add_argument("--signal-runs", type=int, default=100)
+    load.add_argument("--signal-concurrency", type=int, default=10)
+    load.add_argument("--signal-symbols", type=int, default=20)
+    load.add_argument("--hedge-after", type=float, help="Override LLM_HEDGE_AFTER for the run (0 disables hedging)")
+    load.add_argument("--pending", type=int, default=10000, help="Pending entries to monitor")
+    load.add_argument("--symbols", type=int, default=200, help="Symbols the pending entries are spread over")
+    load.add_argument("--min-distance", type=float, default=0.005, help="Closest pending entry, as a fraction of price")
+    load.add_argument("--max-distance", type=float, default=0.1, help="Furthest pending entry, as a fraction of price")
+    load.add_argument("--passes", type=int, default=10)
+    load.add_argument("--universe", type=int, default=100)
+    load.add_argument("--scan-runs", type=int, default=3)
+    load.add_argument("--scan-concurrency", type=int, default=market_scanner.SCAN_CONCURRENCY)
+    load.add_argument("--chats", type=int, default=250)
+    load.add_argument("--background-load", type=int, default=8, help="Background signals kept in flight")
+    load.add_argument("--interactive-runs", type=int, default=30)
+    load.add_argument("--interactive-interval", type=float, default=0.25, help="Seconds between interactive requests")
+    load.add_argument("--scheduler-concurrency", type=int, default=4)
+    load.add_argument("--scheduler-background-slots", type=int, default=2)
+    load.add_argument("--dispatch-rate", type=float, default=25.0, help="Dispatcher global messages per second")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Proactive scanning on a timer versus on market events. Replays synthetic
+minute data for a universe of symbols, with price jumps and volume spikes
+injected at random times, through both strategies and reports how many
+symbols each sends to the LLM and how long after an injected event the
+affected symbol is analysed.
+
+  timer   every --interval seconds, prescreen the whole universe on hourly
+          candles (forming one included) and analyse the top --top-n
+  events  ScanTriggers detectors on every minute's price and forming volume,
+          plus the same prescreen over the symbols whose hourly candle closed
+
+Everything runs offline and no LLM is called; an "analysis" is counted where
+the bot would call get_trading_signal.
+
+    python benchmarks/bench_triggers.py --symbols 50 --days 7
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import compute_features
+from market_scanner import SCAN_CANDLE_LIMIT, prescreen_score
+from scan_triggers import ScanTriggers
+
+MINUTE = 60
+
+def simulate(symbols, minutes, events, seed):
+    """Minute closes and volumes per symbol, plus the injected (minute, symbol, kind) events."""
+    rng = np.random.default_rng(seed)
+    sigma = rng.uniform(0.004, 0.012, symbols) / np.sqrt(60) # Hourly volatility of 0.4-1.2%
+    returns = rng.normal(0.0, 1.0, (symbols, minutes)) * sigma[:, None]
+    volume = rng.lognormal(0.0, 0.5, (symbols, minutes)) * rng.uniform(10, 1000, symbols)[:, None]
+
+    injected = []
+    # Leave the first SCAN_CANDLE_LIMIT hours as history for both strategies.
+    starts = rng.integers(SCAN_CANDLE_LIMIT * 60, minutes - 120, events)
+    for minute in starts:
+        symbol = int(rng.integers(symbols))
+        if rng.random() < 0.5:
+            kind = "jump" # A 4-8 hourly-sigma move spread over five minutes
+            step = rng.choice((-1, 1)) * rng.uniform(4, 8) * sigma[symbol] * np.sqrt(60) / 5
+            returns[symbol, minute:minute + 5] += step
+        else:
+            kind = "volume" # Ten times the usual volume for half an hour
+            volume[symbol, minute:minute + 30] *= 10
+        injected.append((int(minute), symbol, kind))
+    close = 100 * np.exp(np.cumsum(returns, axis=1))
+    return close, volume, sorted(injected)
+
+def hourly(close, volume):
+    """Hourly OHLCV arrays per symbol built from the minute data."""
+    symbols, minutes = close.shape
+    bars = close[:, :minutes // 60 * 60].reshape(symbols, -1, 60)
+    vols = volume[:, :minutes // 60 * 60].reshape(symbols, -1, 60)
+    opens = np.concatenate((bars[:, :1, 0], bars[:, :-1, -1]), axis=1)
+    return {"open": opens, "high": np.maximum(bars.max(axis=2), opens), "low": np.minimum(bars.min(axis=2), opens),
+            "close": bars[:, :, -1], "volume": vols.sum(axis=2)}
+
+def window(bars, symbol, hour, forming=None):
+    """The SCAN_CANDLE_LIMIT candles before `hour` for one symbol, plus an optional forming candle."""
+    start = max(0, hour - SCAN_CANDLE_LIMIT + (forming is not None))
+    arrays = {field: values[symbol, start:hour] for field, values in bars.items()}
+    if forming is not None:
+        arrays = {field: np.append(arrays[field], forming[field]) for field in arrays}
+    return arrays
+
+def forming_candle(close, volume, symbol, minute):
+    hour_start = minute // 60 * 60
+    closes = close[symbol, hour_start:minute + 1]
+    opened = close[symbol, hour_start - 1]
+    return {"open": opened, "high": max(opened, closes.max()), "low": min(opened, closes.min()),
+            "close": closes[-1], "volume": volume[symbol, hour_start:minute + 1].sum()}
+
+def prescreen(candidates, top_n):
+    scored = sorted(((prescreen_score(compute_features(arrays, float(arrays["close"][-1]))), symbol)
+                     for symbol, arrays in candidates), reverse=True)
+    return [symbol for score, symbol in scored[:top_n] if score > 0]
+
+def run_timer(close, volume, bars, args):
+    analyses = []
+    symbols, minutes = close.shape
+    step = args.interval // MINUTE
+    for minute in range(SCAN_CANDLE_LIMIT * 60 + step, minutes, step):
+        candidates = [(symbol, window(bars, symbol, minute // 60, forming_candle(close, volume, symbol, minute)))
+                      for symbol in range(symbols)]
+        analyses += [(minute, symbol, "timer") for symbol in prescreen(candidates, args.top_n)]
+    return analyses
+
+def run_events(close, volume, bars, args):
+    triggers = ScanTriggers(atr_move=args.atr_move, volume_ratio=args.volume_ratio,
+                            level_bars=args.level_bars, level_margin=args.level_margin, cooldown=args.cooldown)
+    symbols, minutes = close.shape
+    first = SCAN_CANDLE_LIMIT * 60
+    for symbol in range(symbols):
+        # prime() drops the last row as the forming candle; give it the closed ones plus a placeholder.
+        triggers.prime(symbol, window(bars, symbol, first // 60 + 1))
+    analyses = []
+    for minute in range(first, minutes):
+        now = minute * MINUTE
+        if minute % 60 == 0 and minute > first:
+            hour = minute // 60
+            for symbol in range(symbols):
+                candle = {field: float(values[symbol, hour - 1]) for field, values in bars.items()}
+                triggers.candle_closed(symbol, candle, now)
+            closed = triggers.take_closed(now)
+            chosen = prescreen([(symbol, window(bars, symbol, hour)) for symbol in closed], args.top_n)
+            triggers.mark_analyzed(chosen, now)
+            analyses += [(minute, symbol, "candle_close") for symbol in chosen]
+        for symbol in range(symbols):
+            reason = triggers.check_price(symbol, float(close[symbol, minute]), now)
+            if reason is None:
+                hour_start = minute // 60 * 60
+                reason = triggers.check_volume(symbol, float(volume[symbol, hour_start:minute + 1].sum()), now)
+            if reason:
+                triggers.mark_analyzed([symbol], now) # Offline every analysis succeeds
+                analyses.append((minute, symbol, reason))
+    return analyses, triggers.stats
+
+def score(analyses, injected, days, horizon):
+    """LLM analyses per day by trigger, and how soon after each injected event its symbol was analysed."""
+    by_symbol = {}
+    for minute, symbol, _ in analyses:
+        by_symbol.setdefault(symbol, []).append(minute)
+    delays = []
+    for minute, symbol, _ in injected:
+        later = [m - minute for m in by_symbol.get(symbol, ()) if minute <= m <= minute + horizon]
+        if later:
+            delays.append(min(later))
+    triggers = {}
+    for _, _, trigger in analyses:
+        triggers[trigger] = triggers.get(trigger, 0) + 1
+    return {
+        "analyses_per_day": round(len(analyses) / days, 1),
+        "by_trigger": triggers,
+        "events_caught": f"{len(delays)}/{len(injected)}",
+        "delay_minutes_p50": float(np.median(delays)) if delays else None,
+        "delay_minutes_p90": float(np.percentile(delays, 90)) if delays else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--days", type=float, default=7, help="Simulated days after the candle history")
+    parser.add_argument("--events", type=int, default=40, help="Injected jumps and volume spikes")
+    parser.add_argument("--interval", type=int, default=900, help="Timer scan interval (s), like PROACTIVE_INTERVAL")
+    parser.add_argument("--top-n", type=int, default=3, help="Candidates analysed per prescreen, like SCAN_TOP_N")
+    parser.add_argument("--atr-move", type=float, default=2)
+    parser.add_argument("--volume-ratio", type=float, default=3)
+    parser.add_argument("--level-bars", type=int, default=24)
+    parser.add_argument("--level-margin", type=float, default=1)
+    parser.add_argument("--cooldown", type=float, default=1800)
+    parser.add_argument("--horizon", type=int, default=120, help="Minutes after an event an analysis still counts")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    minutes = SCAN_CANDLE_LIMIT * 60 + int(args.days * 24 * 60)
+    close, volume, injected = simulate(args.symbols, minutes, args.events, args.seed)
+    bars = hourly(close, volume)
+    events, detector_stats = run_events(close, volume, bars, args)
+    report = {
+        "symbols": args.symbols,
+        "days": args.days,
+        "timer": score(run_timer(close, volume, bars, args), injected, args.days, args.horizon),
+        "events": {**score(events, injected, args.days, args.horizon), "detectors": detector_stats},
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
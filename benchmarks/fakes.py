@@ -0,0 +1,184 @@
+"""
+Local stand-ins for Binance (ccxt), Groq and the Telegram bot, so the
+benchmarks run offline with configurable latency and failure rates.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import binance_api
+import groq_agent
+from candle_store import timeframe_to_ms
+
+HOUR_MS = 3_600_000
+
+class FakeExchange:
+    """
+    ccxt-like exchange with deterministic random-walk prices. Each call sleeps
+    `latency` seconds (plus up to `jitter`) and fails with probability `failure_rate`.
+    """
+
+    def __init__(self, symbols, latency=0.05, jitter=0.02, failure_rate=0.0, seed=7):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.markets = {s: {"symbol": s, "spot": True, "active": True, "quote": s.split("/")[1]} for s in symbols}
+        self.prices = {s: 10.0 ** self.rng.uniform(1, 4.7) for s in symbols}
+        self.calls = 0
+
+    async def _io(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency + self.rng.random() * self.jitter)
+        if self.rng.random() < self.failure_rate:
+            raise ConnectionError("injected exchange failure")
+
+    def step_prices(self, volatility=0.003):
+        """Moves every price one random-walk step."""
+        for symbol in self.prices:
+            self.prices[symbol] *= float(np.exp(self.rng.gauss(0, volatility)))
+
+    async def load_markets(self, reload=False):
+        await self._io()
+        return self.markets
+
+    async def fetch_ohlcv(self, symbol, timeframe='1h', since=None, limit=50, params={}):
+        await self._io()
+        step_ms = timeframe_to_ms(timeframe)
+        now = int(time.time() * 1000) // step_ms * step_ms
+        # Same shape per symbol and timeframe on every call, scaled to end at the current price.
+        seed = zlib.crc32(f"{symbol} {timeframe}".encode())
+        steps = np.cumsum(np.random.default_rng(seed).normal(0, 0.006 * (step_ms / HOUR_MS) ** 0.5, limit))
+        close = self.prices[symbol] * np.exp(steps - steps[-1])
+        open_ = np.concatenate(([close[0]], close[:-1]))
+        spread = close * 0.003
+        start = now - (limit - 1) * step_ms
+        return [[start + i * step_ms, float(o), float(max(o, c) + s), float(min(o, c) - s), float(c), 100.0]
+                for i, (o, c, s) in enumerate(zip(open_, close, spread))]
+
+    async def fetch_ticker(self, symbol, params={}):
+        await self._io()
+        return {"symbol": symbol, "last": self.prices[symbol]}
+
+    async def fetch_tickers(self, symbols=None, params={}):
+        await self._io()
+        return {s: {"symbol": s, "last": self.prices[s], "quoteVolume": self.prices[s] * 1000}
+                for s in (symbols or self.prices)}
+
+    async def close(self):
+        pass
+
+class FakeCompletions:
+    """
+    Stand-in for groq's client.chat.completions: replies with a signal around
+    the prompt's live price after `base_latency` plus a per-prompt-token cost.
+    With probability `tail_rate` a reply takes `tail_latency` longer, with
+    `failure_rate` it raises, and with `invalid_rate` the TP/SL are swapped
+    unless the prompt carries feedback about a rejected answer. With
+    `decode_tps` set, the reply also pays for generating `reasoning_chars` of
+    <think> output and `trailing_chars` of text after the JSON, and
+    `stream=True` returns the text in chunks at that pace.
+    """
+
+    def __init__(self, base_latency=0.5, prefill_tps=2000.0, failure_rate=0.0, tail_rate=0.0,
+                 tail_latency=5.0, invalid_rate=0.0, decode_tps=0.0, reasoning_chars=0, trailing_chars=0, seed=11):
+        self.base_latency = base_latency
+        self.prefill_tps = prefill_tps
+        self.failure_rate = failure_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.invalid_rate = invalid_rate
+        self.decode_tps = decode_tps
+        self.reasoning_chars = reasoning_chars
+        self.trailing_chars = trailing_chars
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.completion_chars = 0 # Characters actually handed to the caller
+
+    def _decode_seconds(self, chars):
+        return chars / 4 / self.decode_tps if self.decode_tps else 0.0
+
+    async def create(self, messages, stream=False, **kwargs):
+        self.calls += 1
+        prompt_tokens = groq_agent.estimate_tokens(messages)
+        slow = self.rng.random() < self.tail_rate
+        await asyncio.sleep(self.base_latency + prompt_tokens / self.prefill_tps + (self.tail_latency if slow else 0.0))
+        if self.rng.random() < self.failure_rate:
+            raise ConnectionError("injected LLM failure")
+        price = float(re.search(r"exactly \$(\d+(?:\.\d+)?)", messages[0]["content"]).group(1))
+        take_profit, stop_loss = price * 1.02, price * 0.99
+        if len(messages) < 3 and self.rng.random() < self.invalid_rate:
+            take_profit, stop_loss = stop_loss, take_profit
+        content = json.dumps({
+            "action": "BUY", "entry": str(price), "take_profit": str(take_profit),
+            "stop_loss": str(stop_loss), "confidence": 0.9, "reason": "benchmark",
+        })
+        text = f"<think>{'.' * self.reasoning_chars}</think>\n{content}\n{'.' * self.trailing_chars}"
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, total_tokens=prompt_tokens + len(text) // 4)
+        if stream:
+            return FakeStream(self, text, usage)
+        await asyncio.sleep(self._decode_seconds(len(text)))
+        self.completion_chars += len(text)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+class FakeStream:
+    """Async iterator of completion chunks shaped like groq's ChatCompletionChunk."""
+
+    def __init__(self, completions, text, usage, chunk_chars=16):
+        self.completions = completions
+        self.text = text
+        self.usage = usage
+        self.chunk_chars = chunk_chars
+        self.closed = False
+
+    async def __aiter__(self):
+        for start in range(0, len(self.text), self.chunk_chars):
+            if self.closed:
+                return
+            piece = self.text[start:start + self.chunk_chars]
+            await asyncio.sleep(self.completions._decode_seconds(len(piece)))
+            self.completions.completion_chars += len(piece)
+            last = start + self.chunk_chars >= len(self.text)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))],
+                usage=None,
+                x_groq=SimpleNamespace(usage=self.usage) if last else None,
+            )
+
+    async def close(self):
+        self.closed = True
+
+class FakeBot:
+    """Telegram Bot stand-in whose send_message just sleeps `latency` seconds."""
+
+    def __init__(self, latency=0.03):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+
+def install_fake_exchange(exchange):
+    """Makes binance_api's shared client manager hand out `exchange`."""
+    binance_api.exchange_manager._exchange = exchange
+    binance_api.exchange_manager.markets_loaded_at = 0.0
+
+def install_fake_llm(completions):
+    """Points groq_agent at `completions` and lifts the request/token budget."""
+    groq_agent.GROQ_API_KEY = groq_agent.GROQ_API_KEY or "offline"
+    groq_agent.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    groq_agent.llm_limiter = groq_agent.LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0)
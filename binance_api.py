@@ -1,52 +1,405 @@
 import ccxt.async_support as ccxt
+import aiohttp
 import asyncio
+import json
 import logging
+import os
+import time
+
+from candle_store import CandleStore
+from metrics import COMPONENT_STATS, EXCHANGE_RETRIES, EXCHANGE_SECONDS
 
 logger = logging.getLogger(__name__)
 
-async def get_candles(symbol='BTC/USDT', time_frame='1h', limit=50, max_retries=3):
-    """Fetches candle data from Binance with an automatic retry mechanism."""
-    binance = ccxt.binance()
+MAX_CONNECTIONS = int(os.getenv("BINANCE_MAX_CONNECTIONS", "50"))
+MARKETS_REFRESH_INTERVAL = int(os.getenv("BINANCE_MARKETS_REFRESH_INTERVAL", "3600"))
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443/stream")
+
+# --- Shared Exchange Client ---
+class ExchangeClientManager:
+    """
+    Owns one long-lived ccxt client for the whole app. The client runs on a
+    pooled keep-alive HTTP session, loads markets once and refreshes them
+    in the background on a timer.
+    """
+
+    def __init__(self, exchange_id='binance', max_connections=MAX_CONNECTIONS,
+                 markets_refresh_interval=MARKETS_REFRESH_INTERVAL):
+        self.exchange_id = exchange_id
+        self.max_connections = max_connections
+        self.markets_refresh_interval = markets_refresh_interval
+        self._exchange = None
+        self._session = None
+        self._refresh_task = None
+        self._lock = None
+        self.markets_loaded_at = None
+        self.in_flight = 0
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "clients_created": 0,
+            "market_refreshes": 0,
+        }
+
+    async def get_exchange(self):
+        """Returns the shared client, creating it and loading markets on first use."""
+        if self._exchange is not None:
+            return self._exchange
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._exchange is None:
+                await self._open()
+        return self._exchange
+
+    async def _open(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+            enable_cleanup_closed=True,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, trust_env=True)
+        # Passing our own session stops ccxt from opening (and closing) one per client.
+        exchange = getattr(ccxt, self.exchange_id)({'session': self._session, 'enableRateLimit': True})
+        try:
+            await exchange.load_markets()
+        except Exception:
+            await exchange.close()
+            await self._session.close()
+            self._session = None
+            raise
+        self._exchange = exchange
+        self.markets_loaded_at = time.time()
+        self.stats["clients_created"] += 1
+        if self.markets_refresh_interval > 0:
+            self._refresh_task = asyncio.create_task(self._refresh_markets_loop())
+        logger.info(f"Opened shared {self.exchange_id} client with {len(exchange.markets)} markets.")
+
+    async def _refresh_markets_loop(self):
+        while True:
+            await asyncio.sleep(self.markets_refresh_interval)
+            try:
+                await self._exchange.load_markets(reload=True)
+                self.markets_loaded_at = time.time()
+                self.stats["market_refreshes"] += 1
+            except Exception as e:
+                logger.warning(f"Failed to refresh {self.exchange_id} markets: {e}")
+
+    async def call(self, method, *args, **kwargs):
+        """Runs a ccxt method on the shared client and records pool stats."""
+        exchange = await self.get_exchange()
+        self.in_flight += 1
+        self.stats["requests"] += 1
+        try:
+            with EXCHANGE_SECONDS.time(method=method):
+                return await getattr(exchange, method)(*args, **kwargs)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def pool_stats(self):
+        """Returns a snapshot of connection pool and request counters."""
+        return {
+            **self.stats,
+            "open": self._exchange is not None,
+            "in_flight": self.in_flight,
+            "max_connections": self.max_connections,
+            "markets": len(self._exchange.markets) if self._exchange is not None else 0,
+            "markets_age_seconds": round(time.time() - self.markets_loaded_at, 1) if self.markets_loaded_at else None,
+        }
+
+    async def close(self):
+        """Stops the refresh timer and closes the client and its HTTP session."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._exchange is not None:
+            await self._exchange.close()
+            self._exchange = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        logger.info(f"Closed shared {self.exchange_id} client.")
+
+exchange_manager = ExchangeClientManager()
+COMPONENT_STATS.add_source("exchange", exchange_manager.pool_stats)
+
+# --- Market Data ---
+async def fetch_ohlcv(symbol, time_frame='1h', since=None, limit=50, max_retries=3):
+    """Fetches raw ccxt OHLCV rows from Binance with an automatic retry mechanism."""
     try:
         for attempt in range(max_retries):
             try:
-                ohlcv = await binance.fetch_ohlcv(symbol, time_frame, limit=limit)
-                formatted_data = [
-                    {
-                        "timestamp": candle[0],
-                        "open": candle[1],
-                        "high": candle[2],
-                        "low": candle[3],
-                        "close": candle[4],
-                        "volume": candle[5]
-                    }
-                    for candle in ohlcv
-                ]
-                return formatted_data
+                return await exchange_manager.call('fetch_ohlcv', symbol, time_frame, since=since, limit=limit)
             except Exception as e:
-                logger.warning(f"Attempt {attempt + 1}/{max_retries} for get_candles failed: {e}")
+                logger.warning(f"Attempt {attempt + 1}/{max_retries} for fetch_ohlcv failed: {e}")
                 if attempt == max_retries - 1:
                     raise e # Re-raise the final exception
+                EXCHANGE_RETRIES.inc(method='fetch_ohlcv')
                 await asyncio.sleep(2 * (attempt + 1)) # Wait longer after each failure
     except Exception as e:
         return {"error": f"Failed to fetch candle data for {symbol} from Binance after {max_retries} attempts. Reason: {e}"}
-    finally:
-        await binance.close()
+
+candle_store = CandleStore(lambda symbol, time_frame, since, limit: fetch_ohlcv(symbol, time_frame, since, limit))
+COMPONENT_STATS.add_source("candle_store", lambda: {**candle_store.stats, "memory_bytes": candle_store.memory_bytes()})
+
+async def get_candle_arrays(symbol='BTC/USDT', time_frame='1h', limit=50):
+    """
+    Returns the latest candles as a dict of read-only NumPy column views
+    ('timestamp', 'open', 'high', 'low', 'close', 'volume') from the shared
+    candle store, fetching only candles newer than the ones already held.
+    """
+    return await candle_store.get(symbol, time_frame, limit)
+
+async def get_candles(symbol='BTC/USDT', time_frame='1h', limit=50):
+    """Fetches candle data as a list of dicts, served from the shared candle store."""
+    columns = await get_candle_arrays(symbol, time_frame, limit)
+    if "error" in columns:
+        return columns
+    return [
+        {
+            "timestamp": int(timestamp),
+            "open": float(open_),
+            "high": float(high),
+            "low": float(low),
+            "close": float(close),
+            "volume": float(volume)
+        }
+        for timestamp, open_, high, low, close, volume in zip(
+            columns["timestamp"], columns["open"], columns["high"], columns["low"], columns["close"], columns["volume"]
+        )
+    ]
 
 async def get_current_price(symbol='BTC/USDT', max_retries=3):
     """Fetches the current price from Binance with an automatic retry mechanism."""
-    binance = ccxt.binance()
     try:
         for attempt in range(max_retries):
             try:
-                ticker = await binance.fetch_ticker(symbol)
+                ticker = await exchange_manager.call('fetch_ticker', symbol)
                 return ticker['last']
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1}/{max_retries} for get_current_price failed: {e}")
                 if attempt == max_retries - 1:
                     raise e # Re-raise the final exception
+                EXCHANGE_RETRIES.inc(method='fetch_ticker')
                 await asyncio.sleep(2 * (attempt + 1)) # Wait longer after each failure
     except Exception as e:
         return {"error": f"Failed to fetch current price for {symbol} from Binance after {max_retries} attempts. Reason: {e}"}
-    finally:
-        await binance.close()
\ No newline at end of file
+
+async def get_current_prices(symbols, max_retries=3):
+    """
+    Fetches the last price for many symbols with a single bulk ticker request.
+    Symbols the exchange does not list are logged and left out, so one bad
+    entry cannot fail the request for every other symbol.
+    """
+    try:
+        for attempt in range(max_retries):
+            try:
+                exchange = await exchange_manager.get_exchange()
+                unknown = [symbol for symbol in symbols if symbol not in exchange.markets]
+                if unknown:
+                    logger.warning(f"Skipping symbols not listed on {exchange_manager.exchange_id}: {', '.join(unknown)}")
+                    symbols = [symbol for symbol in symbols if symbol in exchange.markets]
+                if not symbols:
+                    return {}
+                tickers = await exchange_manager.call('fetch_tickers', list(symbols))
+                return {symbol: ticker['last'] for symbol, ticker in tickers.items() if ticker.get('last') is not None}
+            except ccxt.BadSymbol as e:
+                # One delisted or unknown symbol fails the whole bulk request; price the rest one by one.
+                logger.warning(f"Bulk ticker request rejected ({e}); fetching {len(symbols)} symbols individually.")
+                return await _get_prices_individually(symbols)
+            except Exception as e:
+                logger.warning(f"Attempt {attempt + 1}/{max_retries} for get_current_prices failed: {e}")
+                if attempt == max_retries - 1:
+                    raise e # Re-raise the final exception
+                EXCHANGE_RETRIES.inc(method='fetch_tickers')
+                await asyncio.sleep(2 * (attempt + 1)) # Wait longer after each failure
+    except Exception as e:
+        return {"error": f"Failed to fetch tickers for {len(symbols)} symbols from Binance after {max_retries} attempts. Reason: {e}"}
+
+async def _get_prices_individually(symbols):
+    async def fetch(symbol):
+        try:
+            return symbol, (await exchange_manager.call('fetch_ticker', symbol))['last']
+        except ccxt.BadSymbol as e:
+            logger.warning(f"Skipping {symbol}: {e}")
+        except Exception as e:
+            logger.warning(f"Failed to fetch ticker for {symbol}: {e}")
+        return symbol, None
+
+    prices = await asyncio.gather(*(fetch(symbol) for symbol in symbols))
+    return {symbol: price for symbol, price in prices if price is not None}
+
+async def close_exchange(application=None):
+    """Snapshots cached candles and closes the shared exchange client. Usable as an Application post_shutdown hook."""
+    candle_store.save_snapshots()
+    await exchange_manager.close()
+
+# --- Streaming Market Data ---
+def to_stream_symbol(symbol):
+    """Converts a ccxt symbol ('BTC/USDT') to a Binance stream name prefix ('btcusdt')."""
+    return symbol.replace('/', '').lower()
+
+class PriceStream:
+    """
+    Streams Binance miniTicker (and optionally kline) updates over one combined
+    WebSocket connection and pushes them to callbacks as events.
+
+    `on_price(symbol, price)` is called for every ticker update,
+    `on_kline(symbol, candle)` for every update of a forming kline and
+    `on_candle_close(symbol, candle)` whenever a kline closes. All are plain
+    functions called from the reader task, so they must not block. The stream
+    reconnects with exponential backoff and resubscribes everything it was
+    watching; callers should fall back to polling while `is_live()` is False.
+    """
+
+    def __init__(self, url=BINANCE_WS_URL, on_price=None, on_candle_close=None, on_kline=None,
+                 kline_interval='1h', max_reconnect_delay=60, stale_after=30):
+        self.url = url
+        self.on_price = on_price
+        self.on_candle_close = on_candle_close
+        self.on_kline = on_kline
+        self.kline_interval = kline_interval
+        self.max_reconnect_delay = max_reconnect_delay
+        self.stale_after = stale_after
+        self._symbols = {}  # stream symbol -> ccxt symbol
+        self._streams = set()
+        self._ws = None
+        self._session = None
+        self._task = None
+        self._request_id = 0
+        self.last_message_at = None
+        self.prices = {}  # symbol -> (price, received_at)
+        self.stats = {"messages": 0, "price_updates": 0, "candle_closes": 0, "reconnects": 0}
+
+    def subscribe(self, symbols, klines=False):
+        """Adds symbols to the stream. Safe to call before or after start()."""
+        new_streams = []
+        for symbol in symbols:
+            stream_symbol = to_stream_symbol(symbol)
+            self._symbols[stream_symbol] = symbol
+            wanted = [f"{stream_symbol}@miniTicker"]
+            if klines:
+                wanted.append(f"{stream_symbol}@kline_{self.kline_interval}")
+            new_streams.extend(stream for stream in wanted if stream not in self._streams)
+        if not new_streams:
+            return
+        self._streams.update(new_streams)
+        if self._ws is not None and not self._ws.closed:
+            asyncio.create_task(self._send_subscribe(new_streams))
+
+    async def _send_subscribe(self, streams):
+        streams = list(streams)
+        # Binance caps the number of params per request, so subscribe in chunks.
+        for i in range(0, len(streams), 200):
+            self._request_id += 1
+            try:
+                await self._ws.send_str(json.dumps({"method": "SUBSCRIBE", "params": streams[i:i + 200], "id": self._request_id}))
+            except Exception as e:
+                logger.warning(f"Failed to subscribe to {len(streams)} streams: {e}")
+                return
+
+    def is_live(self):
+        """True while connected and receiving messages."""
+        return (
+            self._ws is not None and not self._ws.closed
+            and self.last_message_at is not None
+            and time.monotonic() - self.last_message_at < self.stale_after
+        )
+
+    def fresh_price(self, symbol, max_age=None):
+        """Returns the last streamed price for a symbol, or None if it is missing or stale."""
+        entry = self.prices.get(symbol)
+        if entry is None:
+            return None
+        price, received_at = entry
+        if time.monotonic() - received_at > (max_age or self.stale_after):
+            return None
+        return price
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _run(self):
+        self._session = aiohttp.ClientSession()
+        delay = 1
+        while True:
+            try:
+                async with self._session.ws_connect(self.url, heartbeat=20) as ws:
+                    self._ws = ws
+                    logger.info(f"Price stream connected to {self.url}.")
+                    if self._streams:
+                        await self._send_subscribe(self._streams)
+                    delay = 1
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._handle_message(msg.data)
+                        elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Price stream error: {e}")
+            finally:
+                self._ws = None
+            self.stats["reconnects"] += 1
+            logger.info(f"Price stream disconnected, reconnecting in {delay}s.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _handle_message(self, raw):
+        self.last_message_at = time.monotonic()
+        self.stats["messages"] += 1
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            return
+        data = payload.get("data", payload)
+        event = data.get("e") if isinstance(data, dict) else None
+        if event not in ("24hrMiniTicker", "kline"):
+            return # Subscription acks and other control messages
+        symbol = self._symbols.get(data.get("s", "").lower())
+        if symbol is None:
+            return
+
+        if event == "kline":
+            kline = data["k"]
+            price = float(kline["c"])
+            callback = self.on_candle_close if kline.get("x") else self.on_kline
+            if kline.get("x"):
+                self.stats["candle_closes"] += 1
+            if callback is not None:
+                callback(symbol, {
+                    "timestamp": kline["t"],
+                    "open": float(kline["o"]),
+                    "high": float(kline["h"]),
+                    "low": float(kline["l"]),
+                    "close": price,
+                    "volume": float(kline["v"]),
+                })
+        else:
+            price = float(data["c"])
+
+        self.prices[symbol] = (price, self.last_message_at)
+        self.stats["price_updates"] += 1
+        if self.on_price is not None:
+            self.on_price(symbol, price)
+
+price_stream = PriceStream()
+COMPONENT_STATS.add_source("price_stream", lambda: price_stream.stats)
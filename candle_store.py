@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CANDLE_STORE_CAPACITY = int(os.getenv("CANDLE_STORE_CAPACITY", "500"))
+CANDLE_STORE_MAX_SERIES = int(os.getenv("CANDLE_STORE_MAX_SERIES", "1000"))
+CANDLE_SNAPSHOT_DIR = os.getenv("CANDLE_SNAPSHOT_DIR") # Unset disables on-disk snapshots
+VALUE_FIELDS = ("open", "high", "low", "close", "volume")
+TIMEFRAME_UNITS_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+def timeframe_to_ms(timeframe):
+    """'15m' -> 900000, '1h' -> 3600000, ..."""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS_MS[timeframe[-1]]
+
+class CandleBuffer:
+    """
+    Columnar ring buffer for one (symbol, timeframe) series.
+
+    Columns are allocated at twice the capacity and appended to linearly; when
+    the end is reached the newest rows are moved to the front. The latest N
+    rows are therefore always contiguous and can be handed out as read-only
+    views. A view of N rows stays intact for at least `capacity - N` further
+    appends; only its last row changes when the forming candle is updated.
+    Memory is fixed at 2 * capacity * 48 bytes.
+    """
+
+    def __init__(self, capacity=CANDLE_STORE_CAPACITY):
+        self.capacity = capacity
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((len(VALUE_FIELDS), 2 * capacity), dtype=np.float64)
+        self._end = 0
+        self.size = 0
+        self.fetched_at = 0.0
+
+    @property
+    def last_timestamp(self):
+        return int(self._timestamps[self._end - 1]) if self.size else None
+
+    @property
+    def nbytes(self):
+        return self._timestamps.nbytes + self._values.nbytes
+
+    def extend(self, ohlcv):
+        """
+        Appends ccxt OHLCV rows ([timestamp, open, high, low, close, volume]).
+        Rows older than the last stored candle are ignored and a row with the
+        same timestamp replaces it (the still-forming candle).
+        """
+        rows = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 1 + len(VALUE_FIELDS))
+        if self.size:
+            last_ts = self._timestamps[self._end - 1]
+            rows = rows[rows[:, 0] >= last_ts]
+            if rows.shape[0] and rows[0, 0] == last_ts:
+                self._values[:, self._end - 1] = rows[0, 1:]
+                rows = rows[1:]
+        rows = rows[-self.capacity:]
+        count = rows.shape[0]
+        if not count:
+            return 0
+
+        if self._end + count > self._timestamps.size:
+            keep = min(self.size, self.capacity - count)
+            self._timestamps[:keep] = self._timestamps[self._end - keep:self._end]
+            self._values[:, :keep] = self._values[:, self._end - keep:self._end]
+            self._end = keep
+            self.size = keep
+
+        self._timestamps[self._end:self._end + count] = rows[:, 0]
+        self._values[:, self._end:self._end + count] = rows[:, 1:].T
+        self._end += count
+        self.size = min(self.size + count, self.capacity)
+        return count
+
+    def view(self, limit=None):
+        """Returns the latest `limit` candles as a dict of read-only column views (no copies)."""
+        count = self.size if limit is None else min(limit, self.size)
+        start = self._end - count
+        columns = {"timestamp": self._timestamps[start:self._end]}
+        for i, field in enumerate(VALUE_FIELDS):
+            columns[field] = self._values[i, start:self._end]
+        for column in columns.values():
+            column.flags.writeable = False
+        return columns
+
+    def to_ohlcv(self):
+        columns = self.view()
+        return np.column_stack([columns["timestamp"].astype(np.float64)] + [columns[f] for f in VALUE_FIELDS])
+
+class CandleStore:
+    """
+    In-process OHLCV cache keyed by (symbol, timeframe). After the first load
+    only candles from the last stored timestamp onwards are requested, so a
+    refresh is usually one or two rows. `fetcher(symbol, timeframe, since, limit)`
+    must return a list of ccxt OHLCV rows or an {"error": ...} dict.
+    """
+
+    def __init__(self, fetcher, capacity=CANDLE_STORE_CAPACITY, max_series=CANDLE_STORE_MAX_SERIES,
+                 snapshot_dir=CANDLE_SNAPSHOT_DIR, refresh_interval=5.0):
+        self.fetcher = fetcher
+        self.capacity = capacity
+        self.max_series = max_series
+        self.snapshot_dir = snapshot_dir
+        self.refresh_interval = refresh_interval
+        self._buffers = OrderedDict()
+        self._locks = {}
+        self.stats = {"full_fetches": 0, "incremental_fetches": 0, "fresh_hits": 0,
+                      "candles_fetched": 0, "snapshot_loads": 0}
+
+    def _buffer(self, key):
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._load_snapshot(key) or CandleBuffer(self.capacity)
+            self._buffers[key] = buffer
+            while len(self._buffers) > self.max_series and self._evict(key):
+                pass
+        else:
+            self._buffers.move_to_end(key)
+        return buffer
+
+    def _evict(self, keep):
+        """Drops the least recently used series whose lock nobody holds; False if every one is busy."""
+        for key in self._buffers:
+            lock = self._locks.get(key)
+            if key != keep and not (lock and lock.locked()):
+                break
+        else:
+            return False # Every series is mid-fetch; trim on a later insert.
+        del self._buffers[key]
+        self._locks.pop(key, None)
+        return True
+
+    async def get(self, symbol, timeframe='1h', limit=50):
+        """Returns the latest `limit` candles as column views, refreshing only what is missing."""
+        key = (symbol, timeframe)
+        while True:
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                # If the series was evicted while we waited, a newer lock may already guard it.
+                if self._locks.setdefault(key, lock) is lock:
+                    return await self._refresh(key, symbol, timeframe, limit)
+
+    async def _refresh(self, key, symbol, timeframe, limit):
+        """Serves or fetches one series; the caller holds its lock."""
+        buffer = self._buffer(key)
+        if buffer.size >= min(limit, self.capacity) and time.monotonic() - buffer.fetched_at < self.refresh_interval:
+            self.stats["fresh_hits"] += 1
+            return buffer.view(limit)
+
+        timeframe_ms = timeframe_to_ms(timeframe)
+        missing = None
+        if buffer.size >= min(limit, self.capacity):
+            missing = (int(time.time() * 1000) - buffer.last_timestamp) // timeframe_ms + 1
+        if missing is None or missing > self.capacity:
+            # Empty, too short, or too far behind to catch up: reload the whole window.
+            rows = await self.fetcher(symbol, timeframe, None, self.capacity)
+            stat = "full_fetches"
+            if isinstance(rows, dict):
+                return rows
+            buffer = CandleBuffer(self.capacity)
+            self._buffers[key] = buffer
+        else:
+            rows = await self.fetcher(symbol, timeframe, buffer.last_timestamp, missing + 1)
+            stat = "incremental_fetches"
+            if isinstance(rows, dict):
+                return rows
+
+        buffer.extend(rows)
+        buffer.fetched_at = time.monotonic()
+        self.stats[stat] += 1
+        self.stats["candles_fetched"] += len(rows)
+        return buffer.view(limit)
+
+    def memory_bytes(self):
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    # --- Snapshots ---
+    def _snapshot_path(self, key):
+        symbol, timeframe = key
+        return os.path.join(self.snapshot_dir, f"{symbol.replace('/', '_')}_{timeframe}.npy")
+
+    def _load_snapshot(self, key):
+        if not self.snapshot_dir:
+            return None
+        path = self._snapshot_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            buffer = CandleBuffer(self.capacity)
+            buffer.extend(np.load(path))
+            self.stats["snapshot_loads"] += 1
+            return buffer
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable candle snapshot {path}: {e}")
+            return None
+
+    def save_snapshots(self):
+        """Writes every series to snapshot_dir so a restart can warm up without a full refetch."""
+        if not self.snapshot_dir:
+            return 0
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        for key, buffer in list(self._buffers.items()):
+            if buffer.size:
+                np.save(self._snapshot_path(key), buffer.to_ohlcv())
+        return len(self._buffers)
@@ -1,56 +1,284 @@
 import os
 import json
-from groq import Groq
+import time
+import asyncio
+import logging
+from collections import deque
+from groq import AsyncGroq, RateLimitError
 from dotenv import load_dotenv
 
+from llm_stream import MALFORMED_RESPONSE, SIGNAL_FIELDS, StreamingJSONParser, signal_field_error
+from metrics import COMPONENT_STATS, LLM_REQUESTS, LLM_SECONDS, LLM_STREAM_STOPS, LLM_TOKENS
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "6000"))
+# Completion tokens reserved per request until real usage is known; then the observed average is used.
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "600"))
+LLM_MODEL = "deepseek-r1-distill-llama-70b"
+# Stream completions and stop reading as soon as the signal JSON is complete (or clearly broken).
+LLM_STREAMING = os.getenv("LLM_STREAMING", "0").lower() in ("1", "true", "yes")
 
-client = Groq(api_key=GROQ_API_KEY)
+# Without a key the client cannot be built; get_llm_analysis reports the missing key instead.
+client = AsyncGroq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
 
-async def get_llm_analysis(candle_data, current_price):
+# --- Rate Limiting ---
+class LLMRateLimiter:
     """
-    Sends candle data to GROQ LLM for trading analysis, instructing it
-    to generate realistic entry prices based on the live market price.
+    Caps in-flight LLM calls and keeps requests and tokens inside a rolling
+    one-minute budget. Each request reserves its prompt plus the expected
+    completion size, and the reservation is corrected to the usage the API
+    reports. When Groq answers 429 the limiter pauses every caller until the
+    server's retry-after has passed.
     """
-    if not GROQ_API_KEY:
-        return {"error": "GROQ_API_KEY not found in .env file"}
 
-    # This prompt is now highly specific, demanding the LLM justify any price
-    # that isn't an immediate market order.
-    prompt = (
-        "You are an expert crypto trading analyst. Your analysis must be sharp, actionable, and grounded in the live data provided."
-        f"The current market price for the asset is exactly ${current_price:.2f}. This is the most critical piece of information."
-        "Analyze the 1H candle data provided in this context."
-        "Your response MUST be a JSON object with the following fields:"
-        "- action: (BUY/SELL/HOLD) The trade direction."
-        "- entry: (string) The target entry price. If this price is not within 0.5% of the current market price, you MUST provide a clear reason in the 'reason' field for why it is a pending/limit order (e.g., 'waiting for a breakout above resistance' or 'buying a dip at support')."
-        "- take_profit: (string) The take profit price."
-        "- stop_loss: (string) The stop loss price."
-        "- confidence: (float) Your confidence in this signal, from 0.0 to 1.0."
-        "- reason: (string) A concise explanation of the technical indicators (RSI, MACD, EMA, Support/Resistance) that justify this signal. If it's a pending order, this field MUST explain the strategy."
-        "Generate a signal that a real trader would find useful. Do not invent prices wildly."
-    )
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=LLM_TOKENS_PER_MINUTE, expected_completion_tokens=LLM_EXPECTED_COMPLETION_TOKENS,
+                 window=60.0):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.expected_completion_tokens = expected_completion_tokens
+        self.window = window
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._requests = deque() # timestamps of started requests
+        self._tokens = deque() # [timestamp, tokens, prompt tokens] reservations charged against the budget
+        self._blocked_until = 0.0
+        self.in_flight = 0
+        self.stats = {"requests": 0, "tokens": 0, "throttled_seconds": 0.0, "rate_limited": 0}
+
+    def _prune(self, now):
+        while self._requests and now - self._requests[0] >= self.window:
+            self._requests.popleft()
+        while self._tokens and now - self._tokens[0][0] >= self.window:
+            self._tokens.popleft()
+
+    def _wait_time(self, now, tokens):
+        self._prune(now)
+        wait = self._blocked_until - now
+        if self.requests_per_minute and len(self._requests) >= self.requests_per_minute:
+            wait = max(wait, self._requests[0] + self.window - now)
+        if self.tokens_per_minute and self._tokens:
+            used = sum(reservation[1] for reservation in self._tokens)
+            # Wait for old spend to roll out of the window, unless nothing is left to roll out.
+            if used + tokens > self.tokens_per_minute:
+                wait = max(wait, self._tokens[0][0] + self.window - now)
+        return wait
+
+    async def acquire(self, prompt_tokens):
+        """
+        Waits for a concurrency slot and enough request/token budget for the
+        prompt plus an expected completion. Returns the reservation to pass to
+        release().
+        """
+        estimated_tokens = prompt_tokens + self.expected_completion_tokens
+        await self._semaphore.acquire()
+        try:
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(now, estimated_tokens)
+                if wait <= 0:
+                    break
+                self.stats["throttled_seconds"] += wait
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        reservation = [now, estimated_tokens, prompt_tokens]
+        self._requests.append(now)
+        self._tokens.append(reservation)
+        self.in_flight += 1
+        self.stats["requests"] += 1
+        return reservation
 
+    def release(self, reservation, used_tokens=None):
+        """Frees the slot and corrects the reservation, and the expected completion size, with the real usage."""
+        if used_tokens is not None:
+            reservation[1] = used_tokens # Still in the window, so the budget sum picks it up
+            completion_tokens = max(0, used_tokens - reservation[2])
+            self.expected_completion_tokens += round((completion_tokens - self.expected_completion_tokens) * 0.2)
+            self.stats["tokens"] += used_tokens
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def back_off(self, seconds):
+        """Pauses all callers, e.g. after a 429 from the API."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self.stats["rate_limited"] += 1
+
+llm_limiter = LLMRateLimiter()
+COMPONENT_STATS.add_source("llm", lambda: {**llm_limiter.stats, "in_flight": llm_limiter.in_flight,
+                                            "expected_completion_tokens": llm_limiter.expected_completion_tokens})
+
+def _retry_after(error, default=10.0):
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": prompt,
-                },
-                {
-                    "role": "user",
-                    "content": f"Candle data: {json.dumps(candle_data)}",
-                },
-            ],
-            model="deepseek-r1-distill-llama-70b",
-            response_format={"type": "json_object"},
+        return float(error.response.headers.get("retry-after", default))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+# --- LLM Analysis ---
+def build_messages(market_data, current_price, feedback=None):
+    """
+    Builds the chat messages for a signal request. `market_data` is either the
+    compact indicator summary from indicators.compute_features (a dict,
+    optionally with higher-timeframe summaries under "timeframes") or the
+    raw list of candle dicts. `feedback` explains why a previous answer was
+    rejected, so a retry can correct it instead of repeating it.
+    """
+    if isinstance(market_data, dict):
+        # The summary already says what was computed, so the instructions only need the output contract.
+        timeframes = ""
+        if "timeframes" in market_data:
+            timeframes = "; prefer signals that agree with the higher-timeframe trends under 'timeframes'"
+        prompt = (
+            f"You are a crypto trading analyst. The current price is exactly ${current_price:.2f}. "
+            f"Use the 1H indicator summary (RSI, MACD, EMA 9/21/50, ATR, Bollinger, pivot support/resistance){timeframes}. "
+            "Reply with a JSON object: action (BUY/SELL/HOLD), entry, take_profit, stop_loss (prices), "
+            "confidence (0.0-1.0), reason (the indicators behind the signal; if entry is more than 0.5% from the "
+            "current price, also the setup that makes it a limit order). Keep prices realistic."
         )
-        
-        response_content = chat_completion.choices[0].message.content
-        return json.loads(response_content)
+        user_content = f"Indicator summary: {json.dumps(market_data, separators=(',', ':'))}"
+    else:
+        user_content = f"Candle data: {json.dumps(market_data)}"
+        # This prompt is now highly specific, demanding the LLM justify any price
+        # that isn't an immediate market order.
+        prompt = (
+            "You are an expert crypto trading analyst. Your analysis must be sharp, actionable, and grounded in the live data provided."
+            f"The current market price for the asset is exactly ${current_price:.2f}. This is the most critical piece of information."
+            "Analyze the 1H candle data provided in this context."
+            "Your response MUST be a JSON object with the following fields:"
+            "- action: (BUY/SELL/HOLD) The trade direction."
+            "- entry: (string) The target entry price. If this price is not within 0.5% of the current market price, you MUST provide a clear reason in the 'reason' field for why it is a pending/limit order (e.g., 'waiting for a breakout above resistance' or 'buying a dip at support')."
+            "- take_profit: (string) The take profit price."
+            "- stop_loss: (string) The stop loss price."
+            "- confidence: (float) Your confidence in this signal, from 0.0 to 1.0."
+            "- reason: (string) A concise explanation of the technical indicators (RSI, MACD, EMA, Support/Resistance) that justify this signal. If it's a pending order, this field MUST explain the strategy."
+            "Generate a signal that a real trader would find useful. Do not invent prices wildly."
+        )
+    messages = [
+        {
+            "role": "system",
+            "content": prompt,
+        },
+        {
+            "role": "user",
+            "content": user_content,
+        },
+    ]
+    if feedback:
+        messages.append({"role": "user", "content": feedback})
+    return messages
+
+def estimate_tokens(messages):
+    """Rough token count (~4 characters per token) until the API reports real usage."""
+    return sum(len(message["content"]) for message in messages) // 4
+
+async def _complete_analysis(messages):
+    """Waits for the whole completion in JSON mode. Returns (analysis, tokens used or None)."""
+    chat_completion = await client.chat.completions.create(
+        messages=messages,
+        model=LLM_MODEL,
+        response_format={"type": "json_object"},
+    )
+    used_tokens = None
+    if chat_completion.usage is not None:
+        used_tokens = chat_completion.usage.total_tokens
+        LLM_TOKENS.inc(chat_completion.usage.prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(used_tokens - chat_completion.usage.prompt_tokens, kind="completion")
+    return json.loads(chat_completion.choices[0].message.content), used_tokens
+
+async def _stream_analysis(messages):
+    """
+    Streams the completion through an incremental JSON parser and hangs up as
+    soon as every signal field has arrived, or as soon as the output is
+    clearly malformed. Returns (analysis, tokens used or None).
+    """
+    parser = StreamingJSONParser()
+    problem = None
+    usage = None
+    streamed_chars = 0
+    finished = False
+    # JSON mode cannot be combined with streaming; the prompt already demands a JSON object.
+    stream = await client.chat.completions.create(messages=messages, model=LLM_MODEL, stream=True)
+    try:
+        async for chunk in stream:
+            # Groq reports usage on the final chunk, under x_groq.
+            chunk_usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+            if chunk_usage is not None:
+                usage = chunk_usage
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            text = chunk.choices[0].delta.content
+            streamed_chars += len(text)
+            for key, value in parser.feed(text):
+                problem = problem or signal_field_error(key, value)
+            problem = problem or parser.error
+            if problem or parser.done or all(field in parser.fields for field in SIGNAL_FIELDS):
+                break
+        else:
+            finished = True
+    finally:
+        await stream.close()
+    if not finished:
+        LLM_STREAM_STOPS.inc(reason="malformed" if problem else "complete")
+
+    if usage is not None:
+        used_tokens = usage.total_tokens
+        LLM_TOKENS.inc(usage.prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(used_tokens - usage.prompt_tokens, kind="completion")
+    else:
+        # Hung up early, so the API never reported usage; charge what was received.
+        used_tokens = estimate_tokens(messages) + streamed_chars // 4
+        LLM_TOKENS.inc(streamed_chars // 4, kind="completion_estimated")
+
+    if problem:
+        return {"error": f"{MALFORMED_RESPONSE}: {problem}"}, used_tokens
+    if not parser.fields:
+        return {"error": f"{MALFORMED_RESPONSE}: no JSON object in the response"}, used_tokens
+    # Missing fields are left for signal validation to report.
+    return dict(parser.fields), used_tokens
+
+async def get_llm_analysis(market_data, current_price, feedback=None):
+    """
+    Sends market data (an indicator summary or raw candles) to GROQ LLM for
+    trading analysis, instructing it to generate realistic entry prices based
+    on the live market price.
+    """
+    if not GROQ_API_KEY:
+        return {"error": "GROQ_API_KEY not found in .env file"}
+
+    messages = build_messages(market_data, current_price, feedback)
+    reservation = await llm_limiter.acquire(estimate_tokens(messages))
+    used_tokens = None
+    try:
+        with LLM_SECONDS.time():
+            if LLM_STREAMING:
+                analysis, used_tokens = await _stream_analysis(messages)
+            else:
+                analysis, used_tokens = await _complete_analysis(messages)
+        LLM_REQUESTS.inc(outcome="malformed" if "error" in analysis else "ok")
+        return analysis
 
+    except RateLimitError as e:
+        LLM_REQUESTS.inc(outcome="rate_limited")
+        retry_after = _retry_after(e)
+        logger.warning(f"GROQ rate limit hit, pausing LLM calls for {retry_after:.0f}s.")
+        llm_limiter.back_off(retry_after)
+        return {"error": f"Failed to get analysis from GROQ: rate limited, retry in {retry_after:.0f}s"}
+    except asyncio.CancelledError:
+        # A losing hedged attempt, or the caller gave up.
+        LLM_REQUESTS.inc(outcome="cancelled")
+        raise
+    except json.JSONDecodeError as e:
+        LLM_REQUESTS.inc(outcome="invalid_json")
+        return {"error": f"Failed to get analysis from GROQ: {str(e)}"}
     except Exception as e:
-        return {"error": f"Failed to get analysis from GROQ: {str(e)}"}
\ No newline at end of file
+        LLM_REQUESTS.inc(outcome="error")
+        return {"error": f"Failed to get analysis from GROQ: {str(e)}"}
+    finally:
+        llm_limiter.release(reservation, used_tokens)
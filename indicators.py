@@ -0,0 +1,219 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+OHLCV_FIELDS = ("timestamp", "open", "high", "low", "close", "volume")
+
+def candles_to_arrays(candles):
+    """Converts the list of candle dicts from get_candles into column arrays."""
+    raw = np.array([[c[field] for field in OHLCV_FIELDS] for c in candles], dtype=np.float64).reshape(-1, len(OHLCV_FIELDS))
+    arrays = {field: raw[:, i] for i, field in enumerate(OHLCV_FIELDS)}
+    arrays["timestamp"] = arrays["timestamp"].astype(np.int64)
+    return arrays
+
+# --- Moving Averages ---
+def ewm(values, alpha):
+    """
+    Exponentially weighted mean y[t] = alpha * x[t] + (1 - alpha) * y[t-1],
+    seeded with the first value. Evaluated in blocks with cumsum so there is
+    no per-bar Python loop; the block length keeps decay**-k inside float range.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    if values.size == 0:
+        return out
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[:] = values
+        return out
+    block = max(1, min(256, int(100 / -np.log10(decay)))) if decay < 1.0 else 256
+    powers = decay ** np.arange(block)
+    prev = values[0]
+    for start in range(0, values.size, block):
+        x = values[start:start + block]
+        p = powers[:x.size]
+        out[start:start + x.size] = decay * p * prev + alpha * np.cumsum(x / p) * p
+        prev = out[start + x.size - 1]
+    return out
+
+def ema(values, period):
+    return ewm(values, 2.0 / (period + 1))
+
+def sma(values, period):
+    """Simple moving average; the first period-1 values are NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full_like(values, np.nan)
+    if values.size >= period:
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[period - 1:] = (csum[period:] - csum[:-period]) / period
+    return out
+
+# --- Oscillators & Volatility ---
+def rsi(close, period=14):
+    """Wilder's RSI."""
+    delta = np.diff(close, prepend=close[0])
+    gain = ewm(np.clip(delta, 0, None), 1.0 / period)
+    loss = ewm(np.clip(-delta, 0, None), 1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gain / loss
+        out = 100.0 - 100.0 / (1.0 + rs)
+    out[loss == 0] = 100.0
+    out[(gain == 0) & (loss == 0)] = 50.0
+    return out
+
+def macd(close, fast=12, slow=26, signal=9):
+    """Returns (macd_line, signal_line, histogram)."""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+def true_range(high, low, close):
+    prev_close = np.concatenate(([close[0]], close[:-1]))
+    return np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+def atr(high, low, close, period=14):
+    """Wilder's Average True Range."""
+    return ewm(true_range(high, low, close), 1.0 / period)
+
+def bollinger_bands(close, period=20, num_std=2.0):
+    """Returns (upper, middle, lower); the first period-1 values are NaN."""
+    middle = sma(close, period)
+    std = np.full_like(middle, np.nan)
+    if close.size >= period:
+        std[period - 1:] = sliding_window_view(close, period).std(axis=1)
+    return middle + num_std * std, middle, middle - num_std * std
+
+# --- Support & Resistance ---
+def pivot_points(high, low, width=3):
+    """
+    Indices of swing highs and lows: bars whose high (low) is the extreme of
+    the `width` bars on either side.
+    """
+    window = 2 * width + 1
+    if high.size < window:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    highs = np.flatnonzero(sliding_window_view(high, window).argmax(axis=1) == width) + width
+    lows = np.flatnonzero(sliding_window_view(low, window).argmin(axis=1) == width) + width
+    return highs, lows
+
+def support_resistance(high, low, price, width=3, max_levels=3):
+    """Nearest pivot-based support levels below and resistance levels above `price`."""
+    pivot_highs, pivot_lows = pivot_points(high, low, width)
+    levels = np.unique(np.concatenate((high[pivot_highs], low[pivot_lows])))
+    supports = levels[levels < price][::-1][:max_levels]
+    resistances = levels[levels > price][:max_levels]
+    return supports, resistances
+
+# --- Resampling ---
+def resample_ohlcv(arrays, source_ms, target_ms):
+    """
+    Aggregates OHLCV columns into coarser bars aligned to whole multiples of
+    `target_ms` since the epoch (UTC), which matches Binance up to 1d. A
+    leading bar missing its first candles is dropped; the last bar is kept
+    even if it is still forming, like the exchange's own forming candle.
+    """
+    if target_ms % source_ms:
+        raise ValueError(f"Cannot resample {source_ms} ms bars into {target_ms} ms bars")
+    timestamp = arrays["timestamp"]
+    if timestamp.size == 0:
+        return {field: arrays[field][:0] for field in OHLCV_FIELDS}
+
+    buckets = timestamp // target_ms * target_ms
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    if timestamp[0] != buckets[0]:
+        starts = starts[1:]
+    if starts.size == 0:
+        return {field: arrays[field][:0] for field in OHLCV_FIELDS}
+    ends = np.append(starts[1:], timestamp.size) - 1
+    return {
+        "timestamp": buckets[starts],
+        "open": arrays["open"][starts],
+        "high": np.maximum.reduceat(arrays["high"], starts),
+        "low": np.minimum.reduceat(arrays["low"], starts),
+        "close": arrays["close"][ends],
+        "volume": np.add.reduceat(arrays["volume"], starts),
+    }
+
+def tail(arrays, limit):
+    """The last `limit` rows of every column."""
+    return {field: values[-limit:] for field, values in arrays.items()}
+
+# --- Feature Summary ---
+def _last(values):
+    value = float(values[-1])
+    return None if np.isnan(value) else value
+
+def _round(value, digits=4):
+    return None if value is None else float(f"{value:.{digits}g}") if abs(value) < 1 else round(value, 2)
+
+def compute_features(arrays, current_price):
+    """
+    Condenses an OHLCV window into a small dict of indicator readings for the
+    LLM prompt, instead of sending every candle.
+    """
+    close, high, low, volume = arrays["close"], arrays["high"], arrays["low"], arrays["volume"]
+    if close.size < 2:
+        return {"price": _round(current_price), "bars": int(close.size)}
+
+    rsi_values = rsi(close)
+    macd_line, signal_line, histogram = macd(close)
+    emas = {period: _last(ema(close, period)) for period in (9, 21, 50)}
+    atr_value = _last(atr(high, low, close))
+    upper, middle, lower = bollinger_bands(close)
+    supports, resistances = support_resistance(high, low, current_price)
+    avg_volume = volume[-20:].mean()
+
+    if emas[9] > emas[21] > emas[50]:
+        ema_stack = "bullish"
+    elif emas[9] < emas[21] < emas[50]:
+        ema_stack = "bearish"
+    else:
+        ema_stack = "mixed"
+
+    if histogram.size >= 2 and np.sign(histogram[-1]) != np.sign(histogram[-2]):
+        macd_cross = "bullish" if histogram[-1] > 0 else "bearish"
+    else:
+        macd_cross = None
+
+    band_width = (upper[-1] - lower[-1]) if not np.isnan(upper[-1]) else None
+    return {
+        "price": _round(current_price),
+        "bars": int(close.size),
+        "change_pct": round(float((close[-1] / close[0] - 1) * 100), 2),
+        "range": [_round(float(low.min())), _round(float(high.max()))],
+        "rsi14": round(_last(rsi_values), 1),
+        "rsi14_prev": round(float(rsi_values[-2]), 1),
+        "macd": {"line": _round(_last(macd_line)), "signal": _round(_last(signal_line)),
+                 "hist": _round(_last(histogram)), "cross": macd_cross},
+        "ema": {str(period): _round(value) for period, value in emas.items()},
+        "ema_stack": ema_stack,
+        "atr14": _round(atr_value),
+        "atr_pct": round(atr_value / current_price * 100, 2) if current_price else None,
+        "bollinger": {"upper": _round(_last(upper)), "mid": _round(_last(middle)), "lower": _round(_last(lower)),
+                      "pct_b": round(float((current_price - lower[-1]) / band_width), 2) if band_width else None},
+        "support": [_round(float(level)) for level in supports],
+        "resistance": [_round(float(level)) for level in resistances],
+        "volume_ratio": round(float(volume[-1] / avg_volume), 2) if avg_volume else None,
+    }
+
+def trend_summary(arrays, current_price):
+    """
+    Short higher-timeframe reading (trend, momentum, volatility) for context
+    next to the full compute_features of the signal timeframe. Works with
+    however many bars are available; the EMA 50 is only reported from 50 bars.
+    """
+    close, high, low = arrays["close"], arrays["high"], arrays["low"]
+    if close.size < 2:
+        return {"bars": int(close.size)}
+    fast, slow = _last(ema(close, 9)), _last(ema(close, 21))
+    atr_value = _last(atr(high, low, close))
+    summary = {
+        "bars": int(close.size),
+        "change_pct": round(float((close[-1] / close[0] - 1) * 100), 2),
+        "trend": "up" if fast > slow else "down" if fast < slow else "flat",
+        "rsi14": round(_last(rsi(close)), 1),
+        "macd_hist": _round(_last(macd(close)[2])),
+        "atr_pct": round(atr_value / current_price * 100, 2) if current_price else None,
+    }
+    if close.size >= 50:
+        summary["above_ema50"] = bool(current_price > _last(ema(close, 50)))
+    return summary
@@ -0,0 +1,124 @@
+import json
+
+SIGNAL_FIELDS = ("action", "entry", "take_profit", "stop_loss", "confidence", "reason")
+SIGNAL_ACTIONS = ("BUY", "SELL", "HOLD")
+THINK_OPEN, THINK_CLOSE = "<think>", "</think>"
+MAX_PREAMBLE = 4000 # Characters of non-reasoning text tolerated before the JSON object
+MAX_MEMBER = 8000 # Characters a single "key": value pair may grow to
+MALFORMED_RESPONSE = "Malformed LLM response"
+
+class StreamingJSONParser:
+    """
+    Incrementally parses the first top-level JSON object in streamed LLM
+    output. Reasoning inside <think>...</think> is skipped. Each top-level
+    "key": value pair is decoded as soon as the comma or closing brace after
+    it arrives, so callers can inspect fields before the object is finished.
+    """
+
+    def __init__(self, max_preamble=MAX_PREAMBLE, max_member=MAX_MEMBER):
+        self.max_preamble = max_preamble
+        self.max_member = max_member
+        self.fields = {}
+        self.done = False # The closing brace was seen
+        self.error = None # Set once the output can no longer be a valid object
+        self._preamble = ""
+        self._in_think = False
+        self._started = False
+        self._depth = 1
+        self._in_string = False
+        self._escape = False
+        self._member = []
+
+    def feed(self, text):
+        """Consumes the next chunk and returns the (key, value) pairs completed by it."""
+        if self.done or self.error:
+            return []
+        if not self._started:
+            text = self._skip_preamble(text)
+            if text is None:
+                return []
+        return self._scan(text)
+
+    def _skip_preamble(self, text):
+        # Returns the text after the object's opening brace, or None while still waiting for it.
+        self._preamble += text
+        while True:
+            if self._in_think:
+                end = self._preamble.find(THINK_CLOSE)
+                if end < 0:
+                    # Reasoning can be long; only keep enough to spot a split closing tag.
+                    self._preamble = self._preamble[-len(THINK_CLOSE):]
+                    return None
+                self._preamble = self._preamble[end + len(THINK_CLOSE):]
+                self._in_think = False
+            think = self._preamble.find(THINK_OPEN)
+            brace = self._preamble.find("{")
+            if think >= 0 and (brace < 0 or think < brace):
+                self._preamble = self._preamble[think + len(THINK_OPEN):]
+                self._in_think = True
+                continue
+            if brace >= 0:
+                rest, self._preamble = self._preamble[brace + 1:], ""
+                self._started = True
+                return rest
+            if len(self._preamble) > self.max_preamble:
+                self.error = "no JSON object in the response"
+            return None
+
+    def _scan(self, text):
+        completed = []
+        for char in text:
+            if self._in_string:
+                self._member.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+                    self._finish_member(completed)
+                    break
+            elif char == "," and self._depth == 1:
+                self._finish_member(completed)
+                if self.error:
+                    break
+                continue
+            self._member.append(char)
+        if len(self._member) > self.max_member:
+            self.error = "a JSON field grew too long"
+        return completed
+
+    def _finish_member(self, completed):
+        member = "".join(self._member).strip()
+        self._member = []
+        if not member:
+            return
+        try:
+            pair = json.loads("{" + member + "}")
+        except ValueError:
+            self.error = f"invalid JSON near {member[:40]!r}"
+            return
+        for key, value in pair.items():
+            self.fields[key] = value
+            completed.append((key, value))
+
+def signal_field_error(key, value):
+    """Returns why a streamed signal field is unusable, or None if it looks fine."""
+    if key == "action" and value not in SIGNAL_ACTIONS:
+        return f"action {value!r} is not one of {', '.join(SIGNAL_ACTIONS)}"
+    if key in ("entry", "take_profit", "stop_loss") and (isinstance(value, bool) or not isinstance(value, (int, float, str))):
+        return f"{key} {value!r} is not a price"
+    if key == "confidence" and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        return f"confidence {value!r} is not a number"
+    if key == "reason" and not isinstance(value, str):
+        return "reason is not text"
+    return None
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import time
+
+from binance_api import exchange_manager, get_candle_arrays
+from indicators import compute_features
+from signal_generator import get_trading_signal
+
+logger = logging.getLogger(__name__)
+
+SCAN_SYMBOLS = [s.strip() for s in os.getenv("SCAN_SYMBOLS", "").split(",") if s.strip()]
+SCAN_UNIVERSE_SIZE = int(os.getenv("SCAN_UNIVERSE_SIZE", "100"))
+SCAN_QUOTE = os.getenv("SCAN_QUOTE", "USDT")
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "10"))
+SCAN_TOP_N = int(os.getenv("SCAN_TOP_N", "3"))
+SCAN_CANDLE_LIMIT = 100
+UNIVERSE_REFRESH_INTERVAL = 3600
+
+_universe_cache = (0.0, None) # (expires_at, symbols)
+
+# --- Universe ---
+async def get_scan_universe():
+    """
+    Returns the symbols to scan: SCAN_SYMBOLS if set, otherwise the
+    SCAN_UNIVERSE_SIZE most traded spot pairs quoted in SCAN_QUOTE.
+    """
+    global _universe_cache
+    if SCAN_SYMBOLS:
+        return list(SCAN_SYMBOLS)
+    expires_at, cached = _universe_cache
+    if cached and time.monotonic() < expires_at:
+        return list(cached)
+    try:
+        exchange = await exchange_manager.get_exchange()
+        tickers = await exchange_manager.call('fetch_tickers')
+    except Exception as e:
+        logger.warning(f"Could not rank scan universe by volume, falling back to majors: {e}")
+        return ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+    ranked = []
+    for symbol, ticker in tickers.items():
+        market = exchange.markets.get(symbol)
+        if not market or not market.get('spot') or not market.get('active', True) or market.get('quote') != SCAN_QUOTE:
+            continue
+        ranked.append((ticker.get('quoteVolume') or 0.0, symbol))
+    ranked.sort(reverse=True)
+    universe = [symbol for _, symbol in ranked[:SCAN_UNIVERSE_SIZE]]
+    _universe_cache = (time.monotonic() + UNIVERSE_REFRESH_INTERVAL, universe)
+    return list(universe)
+
+# --- Pre-screen ---
+def prescreen_score(features):
+    """
+    Cheap local ranking of how "interesting" a setup is, so only the best
+    few candidates are sent to the LLM. Higher is better.
+    """
+    if "rsi14" not in features:
+        return 0.0
+    score = max(0.0, abs(features["rsi14"] - 50) - 20) / 10 # RSI beyond 30/70
+    if features["macd"]["cross"]:
+        score += 1.0
+    if features["ema_stack"] != "mixed":
+        score += 0.5
+    if features["atr_pct"]:
+        # Move over the window measured in ATRs, so volatile coins are not favoured by default.
+        score += min(abs(features["change_pct"]) / features["atr_pct"], 10) * 0.2
+    if features["volume_ratio"] and features["volume_ratio"] > 1.5:
+        score += min(features["volume_ratio"] - 1.0, 3.0)
+    return round(score, 3)
+
+# --- Scan ---
+async def scan_market(universe=None, top_n=SCAN_TOP_N, concurrency=SCAN_CONCURRENCY):
+    """
+    Fetches candles for the whole universe with bounded parallelism, ranks
+    symbols with prescreen_score, and runs the full LLM signal pipeline only
+    for the top_n. Returns a report with the signals and per-stage timings.
+    """
+    started = time.monotonic()
+    timings = {}
+
+    stage = time.monotonic()
+    if universe is None:
+        universe = await get_scan_universe()
+    timings["universe"] = time.monotonic() - stage
+
+    stage = time.monotonic()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(symbol):
+        async with semaphore:
+            return symbol, await get_candle_arrays(symbol, limit=SCAN_CANDLE_LIMIT)
+
+    # One symbol's failure must not discard the rest of the scan.
+    fetched = await asyncio.gather(*(fetch(symbol) for symbol in universe), return_exceptions=True)
+    timings["fetch"] = time.monotonic() - stage
+
+    stage = time.monotonic()
+    scored = []
+    fetch_errors = 0
+    for symbol, result in zip(universe, fetched):
+        if isinstance(result, Exception):
+            logger.warning(f"Scan fetch for {symbol} failed: {result}")
+            fetch_errors += 1
+            continue
+        _, candles = result
+        if "error" in candles or len(candles["close"]) < 2:
+            fetch_errors += 1
+            continue
+        features = compute_features(candles, float(candles["close"][-1]))
+        scored.append((prescreen_score(features), symbol))
+    scored.sort(reverse=True)
+    candidates = [symbol for score, symbol in scored[:top_n] if score > 0]
+    timings["prescreen"] = time.monotonic() - stage
+
+    stage = time.monotonic()
+    signals = await asyncio.gather(*(get_trading_signal(symbol, priority="background") for symbol in candidates),
+                                   return_exceptions=True)
+    for i, (symbol, signal_data) in enumerate(zip(candidates, signals)):
+        if isinstance(signal_data, Exception):
+            logger.error(f"Scan signal for {symbol} failed: {signal_data}")
+            signals[i] = {"error": f"Signal generation failed: {signal_data}"}
+    timings["llm"] = time.monotonic() - stage
+    timings["total"] = time.monotonic() - started
+
+    report = {
+        "universe": len(universe),
+        "fetch_errors": fetch_errors,
+        "candidates": [{"symbol": symbol, "score": score} for score, symbol in scored[:top_n] if score > 0],
+        "timings": {name: round(seconds, 3) for name, seconds in timings.items()},
+        "signals": list(zip(candidates, signals)),
+    }
+    logger.info(
+        f"Scanned {len(universe)} symbols in {timings['total']:.1f}s "
+        f"(fetch {timings['fetch']:.1f}s, prescreen {timings['prescreen']:.2f}s, llm {timings['llm']:.1f}s); "
+        f"candidates: {', '.join(candidates) or 'none'}"
+    )
+    return report
@@ -0,0 +1,255 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "8"))
+DISPATCH_GLOBAL_RATE = float(os.getenv("DISPATCH_GLOBAL_RATE", "25")) # Telegram allows ~30 msg/s per bot
+DISPATCH_GLOBAL_BURST = float(os.getenv("DISPATCH_GLOBAL_BURST", "3")) # Messages sent back to back before the rate applies
+DISPATCH_PER_CHAT_RATE = float(os.getenv("DISPATCH_PER_CHAT_RATE", "1")) # and ~1 msg/s per chat
+DISPATCH_MAX_QUEUE = int(os.getenv("DISPATCH_MAX_QUEUE", "100000"))
+MAX_SEND_ATTEMPTS = 3
+# Queue lanes: replies and a user's own alerts go ahead of broadcasts.
+URGENT = 0
+BULK = 1
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def take(self):
+        """Consumes a token and returns 0, or returns how long to wait for one."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def refund(self):
+        """Gives back a token that was taken but not used."""
+        self.tokens = min(self.capacity, self.tokens + 1.0)
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class MessageDispatcher:
+    """
+    Outbound Telegram queue shared by broadcasts, monitoring alerts and
+    handler replies. Concurrent workers send within a global and a per-chat
+    token bucket, honour RetryAfter, and report chats that blocked the bot
+    through `on_blocked(chat_id)`. A message waiting on a busy chat is put back
+    on the queue with a timer instead of holding up a worker. Replies and
+    per-chat alerts go in the urgent lane and are always taken before queued
+    broadcasts.
+    """
+
+    def __init__(self, workers=DISPATCH_WORKERS, global_rate=DISPATCH_GLOBAL_RATE,
+                 per_chat_rate=DISPATCH_PER_CHAT_RATE, max_queue=DISPATCH_MAX_QUEUE, on_blocked=None,
+                 global_burst=DISPATCH_GLOBAL_BURST):
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_queue = max_queue
+        self.on_blocked = on_blocked
+        self.bot = None
+        self._global_bucket = TokenBucket(global_rate, capacity=global_burst)
+        self._chat_buckets = {}
+        self._queue = None
+        self._global_lock = None
+        self._sequence = itertools.count() # Keeps FIFO order within a lane
+        self._tasks = []
+        self._sent_times = deque()
+        self._delayed = {} # Messages waiting on a timer to be re-queued: token -> (timer handle, item)
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "blocked_chats": 0, "dropped": 0}
+
+    async def start(self, bot):
+        self.bot = bot
+        self._queue = asyncio.PriorityQueue()
+        self._global_lock = asyncio.Lock()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout=10.0):
+        """
+        Gives queued messages up to `drain_timeout` seconds to go out, then stops
+        the workers and fails whatever is left so no submit() caller waits forever.
+        """
+        if self._queue is None:
+            return
+        deadline = time.monotonic() + drain_timeout
+        while (self._queue.qsize() or self._delayed) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        undelivered = []
+        for handle, item in self._delayed.values():
+            handle.cancel()
+            undelivered.append(item)
+        self._delayed = {}
+        while not self._queue.empty():
+            undelivered.append(self._queue.get_nowait()[2])
+        self._queue = None # Later sends fail fast instead of queueing into nothing
+        if undelivered:
+            logger.warning(f"Dispatcher stopped with {len(undelivered)} messages undelivered.")
+        for item in undelivered:
+            self._abandon(item)
+
+    # --- Enqueueing ---
+    def _enqueue(self, chat_id, send, future=None, lane=URGENT):
+        if self._queue is None or self._queue.qsize() >= self.max_queue:
+            self.stats["dropped"] += 1
+            if future is not None:
+                future.set_exception(RuntimeError("Message queue is full or not started"))
+            return False
+        self._put((lane, chat_id, send, future, 1))
+        return True
+
+    def _put(self, item):
+        self._queue.put_nowait((item[0], next(self._sequence), item))
+
+    def send(self, chat_id, text, lane=URGENT, **kwargs):
+        """Queues a send_message without waiting for delivery."""
+        return self._enqueue(chat_id, lambda: self.bot.send_message(chat_id=chat_id, text=text, **kwargs), lane=lane)
+
+    def broadcast(self, chat_ids, text, **kwargs):
+        """Queues one already-rendered message for every chat in the bulk lane. Returns how many were queued."""
+        return sum(self.send(chat_id, text, lane=BULK, **kwargs) for chat_id in list(chat_ids))
+
+    async def submit(self, chat_id, send):
+        """
+        Queues an arbitrary Bot API call for `chat_id` (e.g. a reply or an edit)
+        and waits for its result, so handler replies share the same rate limits.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, send, future)
+        return await future
+
+    # --- Delivery ---
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                # Forget chats that have been idle long enough for their bucket to refill.
+                cutoff = time.monotonic() - 60
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if b.updated > cutoff}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=3.0)
+        return bucket
+
+    def _requeue_later(self, delay, item):
+        token = next(self._sequence)
+        self._delayed[token] = (asyncio.get_running_loop().call_later(delay, self._requeue, token), item)
+
+    def _requeue(self, token):
+        _, item = self._delayed.pop(token)
+        self._put(item)
+
+    def _abandon(self, item):
+        self.stats["dropped"] += 1
+        future = item[3]
+        if future is not None and not future.done():
+            future.set_exception(RuntimeError("dispatcher stopped"))
+
+    async def _worker(self):
+        while True:
+            # Take the bot-wide token first and only then pick the message, so the
+            # most urgent one queued at that moment goes out next.
+            async with self._global_lock:
+                while (wait := self._global_bucket.take()) > 0:
+                    await asyncio.sleep(wait)
+                _, _, item = await self._queue.get()
+            try:
+                await self._deliver(item)
+            except asyncio.CancelledError:
+                self._abandon(item) # Stopped mid-send
+                raise
+            except Exception as e:
+                logger.error(f"Dispatcher worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item):
+        lane, chat_id, send, future, attempt = item
+        wait = self._chat_bucket(chat_id).take()
+        if wait > 0:
+            self._global_bucket.refund()
+            self._requeue_later(wait, item)
+            return
+
+        try:
+            result = await send()
+        except RetryAfter as e:
+            # Flood control can be per chat or bot-wide; back off both to be safe.
+            self._chat_bucket(chat_id).block(e.retry_after)
+            self._global_bucket.block(e.retry_after)
+            self.stats["retried"] += 1
+            self._requeue_later(e.retry_after, item)
+            return
+        except Forbidden as e:
+            self._fail(future, e)
+            self.stats["blocked_chats"] += 1
+            if self.on_blocked is not None:
+                self.on_blocked(chat_id)
+            return
+        except BadRequest as e:
+            self._fail(future, e)
+            if "chat not found" in str(e).lower() and self.on_blocked is not None:
+                self.stats["blocked_chats"] += 1
+                self.on_blocked(chat_id)
+            return
+        except NetworkError as e:
+            if attempt < MAX_SEND_ATTEMPTS:
+                self.stats["retried"] += 1
+                self._requeue_later(2 * attempt, (lane, chat_id, send, future, attempt + 1))
+            else:
+                self._fail(future, e)
+            return
+        except Exception as e:
+            self._fail(future, e)
+            return
+
+        self.stats["sent"] += 1
+        self._record_sent()
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def _fail(self, future, error):
+        self.stats["failed"] += 1
+        logger.error(f"Failed to deliver Telegram message: {error}")
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def _record_sent(self):
+        now = time.monotonic()
+        self._sent_times.append(now)
+        while self._sent_times and self._sent_times[0] < now - 60:
+            self._sent_times.popleft()
+
+    def dispatch_stats(self):
+        """Counters plus current queue depth and messages sent per second over the last minute."""
+        cutoff = time.monotonic() - 60
+        while self._sent_times and self._sent_times[0] < cutoff:
+            self._sent_times.popleft()
+        return {
+            **self.stats,
+            "queue_depth": (self._queue.qsize() if self._queue is not None else 0) + len(self._delayed),
+            "sent_per_second": round(len(self._sent_times) / 60, 2),
+        }
+
+message_dispatcher = MessageDispatcher()
@@ -0,0 +1,325 @@
+import bisect
+import functools
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) # 0 disables the HTTP endpoint
+REMOTE_STATS_TTL = 60 # Seconds before a silent worker's stats are dropped
+# Seconds; covers everything from a cached signal to a slow LLM retry loop.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+def _label_key(label_names, labels):
+    if set(labels) != set(label_names):
+        raise ValueError(f"Expected labels {label_names}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+def _format_labels(label_names, key, extra=()):
+    pairs = [*zip(label_names, key), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_value(value):
+    return "+Inf" if value == math.inf else repr(float(value))
+
+# --- Metric Types ---
+class Counter:
+    """Monotonic count, optionally split by labels."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, _format_labels(self.label_names, key), value
+
+class Histogram:
+    """Bucketed distribution of observed values (durations, in seconds)."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {} # key -> [count per bucket..., count above the last bucket, sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall-clock time spent inside the block, even if it raises."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def summary(self, **labels):
+        """Count, mean and bucket-interpolated p50/p95 for one label set, or None if unobserved."""
+        series = self.values.get(_label_key(self.label_names, labels))
+        if series is None or not series[-1]:
+            return None
+        return {
+            "count": series[-1],
+            "mean": series[-2] / series[-1],
+            "p50": self._quantile(series, 0.5),
+            "p95": self._quantile(series, 0.95),
+        }
+
+    def _quantile(self, series, q):
+        target = q * series[-1]
+        cumulative, lower = 0, 0.0
+        for upper, count in zip(self.buckets, series):
+            if count and cumulative + count >= target:
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+            lower = upper
+        return self.buckets[-1] # Above the largest bucket
+
+    def samples(self):
+        for key, series in self.values.items():
+            cumulative = 0
+            for upper, count in zip((*self.buckets, math.inf), series):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(self.label_names, key, [("le", _format_value(upper))]), cumulative
+            yield f"{self.name}_sum", _format_labels(self.label_names, key), series[-2]
+            yield f"{self.name}_count", _format_labels(self.label_names, key), series[-1]
+
+class StatsGauge:
+    """
+    Current values read from the components' existing `stats` dicts at scrape
+    time, as name{component="...",stat="..."}. Non-numeric entries are skipped.
+    Stats reported by worker processes are included as "component@worker".
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.label_names = ("component", "stat")
+        self.sources = {}
+        self.remote = {} # worker -> (received at, {(component, stat): value})
+
+    def add_source(self, component, read_stats):
+        self.sources[component] = read_stats
+
+    def update_remote(self, worker, values):
+        """Replaces the stats last reported by `worker`, as returned by its read()."""
+        self.remote[worker] = (time.monotonic(), values)
+
+    def read(self):
+        values = {}
+        for component, read_stats in self.sources.items():
+            try:
+                stats = read_stats()
+            except Exception as e:
+                logger.warning(f"Could not read {component} stats: {e}")
+                continue
+            for stat, value in stats.items():
+                if isinstance(value, (int, float)):
+                    values[(component, stat)] = value
+        cutoff = time.monotonic() - REMOTE_STATS_TTL
+        self.remote = {worker: report for worker, report in self.remote.items() if report[0] > cutoff}
+        for worker, (_, stats) in sorted(self.remote.items()):
+            for (component, stat), value in stats.items():
+                values[(f"{component}@{worker}", stat)] = value
+        return values
+
+    def samples(self):
+        for key, value in self.read().items():
+            yield self.name, _format_labels(self.label_names, key), value
+
+# --- Registry ---
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def stats_gauge(self, name, help):
+        return self._register(StatsGauge(name, help))
+
+    def collect(self):
+        """
+        Counter and histogram values recorded since the last call, clearing
+        them. Worker processes ship these to the frontend, which merge()s them.
+        """
+        values = {}
+        for metric in self.metrics.values():
+            if isinstance(metric, (Counter, Histogram)) and metric.values:
+                values[metric.name], metric.values = metric.values, {}
+        return values
+
+    def merge(self, values):
+        """Adds counter and histogram values collected in another process."""
+        for name, series_by_key in values.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            for key, series in series_by_key.items():
+                if isinstance(metric, Counter):
+                    metric.values[key] = metric.values.get(key, 0) + series
+                elif key in metric.values:
+                    metric.values[key] = [a + b for a, b in zip(metric.values[key], series)]
+                else:
+                    metric.values[key] = list(series)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# Shared instruments. Modules record into these; labels keep cardinality bounded (no symbols or chat ids).
+STAGE_SECONDS = registry.histogram("signal_stage_seconds", "Time spent per signal pipeline stage.", ("stage",))
+SIGNAL_RETRIES = registry.counter("signal_retries_total", "LLM signal attempts retried, by failure reason.", ("reason",))
+SIGNAL_REJECTIONS = registry.counter("signal_validation_failures_total", "LLM analyses rejected by validation, by reason.", ("reason",))
+SIGNALS = registry.counter("signals_total", "Signals generated, by outcome.", ("outcome",))
+SIGNAL_ATTEMPTS = registry.histogram("signal_llm_attempts", "LLM attempts (including hedges) per generated signal.",
+                                     buckets=(1, 2, 3, 4, 5, 6))
+SIGNAL_HEDGES = registry.counter("signal_hedges_total", "Speculative LLM attempts, by whether they were launched or won.", ("outcome",))
+SIGNAL_DEADLINES = registry.counter("signal_deadlines_total", "Signals abandoned at the generation deadline.")
+EXCHANGE_SECONDS = registry.histogram("exchange_request_seconds", "Binance REST call latency.", ("method",))
+EXCHANGE_RETRIES = registry.counter("exchange_retries_total", "Binance REST calls retried after an error.", ("method",))
+LLM_SECONDS = registry.histogram("llm_request_seconds", "Groq completion latency, excluding rate limiter waits.")
+LLM_REQUESTS = registry.counter("llm_requests_total", "Groq completion requests, by outcome.", ("outcome",))
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens reported by the Groq API (or estimated for streams cut short).", ("kind",))
+LLM_STREAM_STOPS = registry.counter("llm_stream_early_stops_total", "Streamed completions closed before the model finished, by reason.", ("reason",))
+SCHEDULER_WAIT_SECONDS = registry.histogram("scheduler_wait_seconds", "Time signal work waited for a scheduler slot, by priority class.", ("priority",))
+SCHEDULER_REJECTIONS = registry.counter("scheduler_rejections_total", "Signal work refused by admission control, by priority class.", ("priority",))
+SCAN_ANALYSES = registry.counter("scan_analyses_total", "Symbols sent to the signal pipeline by proactive scanning, by trigger.", ("trigger",))
+ALERT_DELAY_SECONDS = registry.histogram("scan_alert_delay_seconds",
+                                         "Time from the market event behind a scan analysis (candle close or detector firing) to its signal.",
+                                         ("trigger",), buckets=(5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600))
+JOB_SECONDS = registry.histogram("job_run_seconds", "Duration of scheduled job runs.", ("job",))
+JOB_FAILURES = registry.counter("job_failures_total", "Scheduled job runs that raised.", ("job",))
+COMPONENT_STATS = registry.stats_gauge("component_stats", "Current counters and gauges from the bot's components.")
+
+def timed_job(name):
+    """Decorates a JobQueue callback so each run's duration and failures are recorded."""
+    def decorator(job):
+        @functools.wraps(job)
+        async def wrapper(*args, **kwargs):
+            with JOB_SECONDS.time(job=name):
+                try:
+                    return await job(*args, **kwargs)
+                except Exception:
+                    JOB_FAILURES.inc(job=name)
+                    raise
+        return wrapper
+    return decorator
+
+# --- Text Report ---
+def _counts(counter):
+    return ", ".join(f"{'/'.join(key) or 'all'}={value:g}" for key, value in sorted(counter.values.items())) or "none"
+
+def _timings(histogram, unit="s"):
+    lines = []
+    for key in sorted(histogram.values):
+        summary = histogram.summary(**dict(zip(histogram.label_names, key)))
+        lines.append(f"  {'/'.join(key) or 'all'}: {summary['count']} x {summary['mean']:.2f}{unit} avg, p95 ~{summary['p95']:.2f}{unit}")
+    return lines or ["  none yet"]
+
+def stats_report():
+    """Plain-text summary of the metrics for the /stats command."""
+    lines = ["Signal stages:", *_timings(STAGE_SECONDS)]
+    lines += [
+        f"Signals: {_counts(SIGNALS)}",
+        f"Retries: {_counts(SIGNAL_RETRIES)}",
+        f"Validation failures: {_counts(SIGNAL_REJECTIONS)}",
+        f"Hedges: {_counts(SIGNAL_HEDGES)}, deadlines hit: {_counts(SIGNAL_DEADLINES)}",
+        "LLM attempts per signal:", *_timings(SIGNAL_ATTEMPTS, unit=""),
+        f"LLM requests: {_counts(LLM_REQUESTS)}",
+        f"LLM tokens: {_counts(LLM_TOKENS)}",
+        f"LLM stream early stops: {_counts(LLM_STREAM_STOPS)}",
+        "Scheduler queue wait:", *_timings(SCHEDULER_WAIT_SECONDS),
+        f"Scheduler rejections: {_counts(SCHEDULER_REJECTIONS)}",
+        f"Exchange retries: {_counts(EXCHANGE_RETRIES)}",
+        "Exchange calls:", *_timings(EXCHANGE_SECONDS),
+        f"Scan analyses: {_counts(SCAN_ANALYSES)}",
+        "Scan alert delay:", *_timings(ALERT_DELAY_SECONDS),
+        "Jobs:", *_timings(JOB_SECONDS),
+        f"Job failures: {_counts(JOB_FAILURES)}",
+    ]
+    by_component = {}
+    for (component, stat), value in COMPONENT_STATS.read().items():
+        by_component.setdefault(component, []).append(f"{stat}={value:g}")
+    lines += [f"{component}: {', '.join(values)}" for component, values in by_component.items()]
+    return "\n".join(lines)
+
+# --- HTTP Endpoint ---
+async def _handle_metrics(request):
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+class MetricsServer:
+    """Serves GET /metrics on a local port for Prometheus to scrape."""
+
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", _handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+metrics_server = MetricsServer()
@@ -0,0 +1,70 @@
+from bisect import bisect_left, bisect_right, insort
+
+def _entry_key(signal):
+    return signal['entry']
+
+class PriceTriggerIndex:
+    """
+    Pending signals grouped by symbol. BUY and SELL entries are kept in lists
+    sorted by entry price, so every level crossed by a new price is found with
+    one bisect and removed with one slice instead of a linear scan.
+    """
+
+    def __init__(self):
+        self._buys = {}  # symbol -> BUY signals sorted by entry
+        self._sells = {}  # symbol -> SELL signals sorted by entry
+
+    def add(self, signal):
+        """Starts watching a pending signal (needs 'symbol', 'entry' and 'action')."""
+        book = self._buys if signal['action'] == 'BUY' else self._sells
+        insort(book.setdefault(signal['symbol'], []), signal, key=_entry_key)
+
+    def pop_triggered(self, symbol, price):
+        """Removes and returns every signal on `symbol` whose entry was crossed by `price`."""
+        triggered = []
+
+        buys = self._buys.get(symbol)
+        if buys:
+            # A BUY fills once the price drops to or below its entry.
+            idx = bisect_left(buys, price, key=_entry_key)
+            triggered.extend(buys[idx:])
+            del buys[idx:]
+            if not buys:
+                del self._buys[symbol]
+
+        sells = self._sells.get(symbol)
+        if sells:
+            # A SELL fills once the price rises to or above its entry.
+            idx = bisect_right(sells, price, key=_entry_key)
+            triggered.extend(sells[:idx])
+            del sells[:idx]
+            if not sells:
+                del self._sells[symbol]
+
+        return triggered
+
+    def remove(self, signal):
+        """Stops watching a single signal. Returns False if it was not being watched."""
+        book = self._buys if signal['action'] == 'BUY' else self._sells
+        signals = book.get(signal['symbol'], [])
+        for idx in range(bisect_left(signals, signal['entry'], key=_entry_key), len(signals)):
+            if signals[idx]['entry'] != signal['entry']:
+                break
+            if signals[idx] is signal:
+                del signals[idx]
+                if not signals:
+                    del book[signal['symbol']]
+                return True
+        return False
+
+    def symbols(self):
+        """Returns the set of symbols with at least one pending signal."""
+        return set(self._buys) | set(self._sells)
+
+    def __iter__(self):
+        for book in (self._buys, self._sells):
+            for signals in book.values():
+                yield from signals
+
+    def __len__(self):
+        return sum(len(s) for s in self._buys.values()) + sum(len(s) for s in self._sells.values())
@@ -0,0 +1,133 @@
+import os
+import time
+from collections import deque
+
+from indicators import atr
+
+SCAN_TRIGGER_ATR_MOVE = float(os.getenv("SCAN_TRIGGER_ATR_MOVE", "2")) # Move from the last close, in ATRs
+SCAN_TRIGGER_VOLUME_RATIO = float(os.getenv("SCAN_TRIGGER_VOLUME_RATIO", "3")) # Forming candle volume vs the average
+SCAN_TRIGGER_LEVEL_BARS = int(os.getenv("SCAN_TRIGGER_LEVEL_BARS", "24")) # Closed candles whose high/low count as levels
+SCAN_TRIGGER_LEVEL_MARGIN = float(os.getenv("SCAN_TRIGGER_LEVEL_MARGIN", "1")) # How far past a level counts as a break, in ATRs
+SCAN_TRIGGER_COOLDOWN = float(os.getenv("SCAN_TRIGGER_COOLDOWN", "1800")) # Seconds after a successful analysis before the next
+VOLUME_BARS = 20
+ATR_PERIOD = 14
+
+class ScanTriggers:
+    """
+    Decides when a symbol is worth an LLM analysis, from streamed data only.
+    Cheap detectors watch every price and forming-candle update: a move of
+    `atr_move` ATRs from the last close, a break of the last `level_bars`
+    candles' high or low by `level_margin` ATRs, and a forming candle already `volume_ratio` times
+    the average volume. Closed candles are collected for a batch prescreen.
+    A firing symbol is not reported again while its analysis runs; the
+    caller ends that with mark_analyzed() on success, which also starts a
+    `cooldown` seconds quiet period, or release() if the analysis failed.
+
+    Reference levels are seeded from candle arrays with prime() and then
+    rolled forward from each closed candle, so no REST calls are needed.
+    All methods are synchronous and take an optional `now` (epoch seconds).
+    """
+
+    def __init__(self, atr_move=SCAN_TRIGGER_ATR_MOVE, volume_ratio=SCAN_TRIGGER_VOLUME_RATIO,
+                 level_bars=SCAN_TRIGGER_LEVEL_BARS, level_margin=SCAN_TRIGGER_LEVEL_MARGIN, cooldown=SCAN_TRIGGER_COOLDOWN):
+        self.atr_move = atr_move
+        self.volume_ratio = volume_ratio
+        self.level_bars = level_bars
+        self.level_margin = level_margin
+        self.cooldown = cooldown
+        self._state = {} # symbol -> reference levels
+        self._analyzed_at = {} # symbol -> when it was last analysed successfully
+        self._analyzing = set() # symbols a detector fired on, awaiting mark_analyzed or release
+        self._closed = {} # symbol -> close time of candles awaiting the batch prescreen
+        self.stats = {"atr_move": 0, "level_break": 0, "volume_spike": 0, "candle_closes": 0, "cooling_down": 0}
+
+    def prime(self, symbol, arrays):
+        """Seeds a symbol's levels from candle arrays; the last (forming) row is ignored."""
+        high, low, close, volume = (arrays[field][:-1] for field in ("high", "low", "close", "volume"))
+        if close.size < 2:
+            return
+        self._state[symbol] = {
+            "anchor": float(close[-1]),
+            "atr": float(atr(high, low, close, ATR_PERIOD)[-1]),
+            "highs": deque(high[-self.level_bars:].tolist(), maxlen=self.level_bars),
+            "lows": deque(low[-self.level_bars:].tolist(), maxlen=self.level_bars),
+            "volumes": deque(volume[-VOLUME_BARS:].tolist(), maxlen=VOLUME_BARS),
+        }
+
+    def is_primed(self, symbol):
+        return symbol in self._state
+
+    def check_price(self, symbol, price, now=None):
+        """Returns the detector that fired for this price ('atr_move' or 'level_break'), or None."""
+        state = self._state.get(symbol)
+        if state is None:
+            return None
+        reason = None
+        if state["atr"] and abs(price - state["anchor"]) >= self.atr_move * state["atr"]:
+            reason = "atr_move"
+        elif (price > max(state["highs"]) + self.level_margin * state["atr"]
+              or price < min(state["lows"]) - self.level_margin * state["atr"]):
+            reason = "level_break"
+        return self._fire(symbol, reason, now)
+
+    def check_volume(self, symbol, volume, now=None):
+        """Returns 'volume_spike' if the forming candle's volume is already unusually high, else None."""
+        state = self._state.get(symbol)
+        if state is None or not state["volumes"]:
+            return None
+        average = sum(state["volumes"]) / len(state["volumes"])
+        return self._fire(symbol, "volume_spike" if average and volume >= self.volume_ratio * average else None, now)
+
+    def _fire(self, symbol, reason, now):
+        if reason is None or symbol in self._analyzing:
+            return None
+        if self._cooling_down(symbol, now):
+            self.stats["cooling_down"] += 1
+            return None
+        self._analyzing.add(symbol)
+        self.stats[reason] += 1
+        return reason
+
+    def _cooling_down(self, symbol, now=None):
+        now = time.time() if now is None else now
+        return now - self._analyzed_at.get(symbol, float("-inf")) < self.cooldown
+
+    def candle_closed(self, symbol, candle, close_time):
+        """
+        Rolls the symbol's levels forward and queues it for the next batch
+        prescreen. Returns True if this starts a new batch.
+        """
+        state = self._state.get(symbol)
+        if state is not None:
+            prev_close = state["anchor"]
+            true_range = max(candle["high"] - candle["low"], abs(candle["high"] - prev_close), abs(candle["low"] - prev_close))
+            state["atr"] += (true_range - state["atr"]) / ATR_PERIOD
+            state["anchor"] = candle["close"]
+            state["highs"].append(candle["high"])
+            state["lows"].append(candle["low"])
+            state["volumes"].append(candle["volume"])
+        self.stats["candle_closes"] += 1
+        new_batch = not self._closed
+        self._closed[symbol] = close_time
+        return new_batch
+
+    def take_closed(self, now=None):
+        """
+        Returns {symbol: close time} for the queued closes, leaving out symbols
+        being analysed or within the cooldown. Pass the ones the prescreen
+        sends to the LLM, and that got a signal, to mark_analyzed.
+        """
+        closed, self._closed = self._closed, {}
+        return {symbol: close_time for symbol, close_time in closed.items()
+                if symbol not in self._analyzing and not self._cooling_down(symbol, now)}
+
+    def mark_analyzed(self, symbols, now=None):
+        """Starts the cooldown for symbols that were just analysed successfully."""
+        now = time.time() if now is None else now
+        for symbol in symbols:
+            self._analyzed_at[symbol] = now
+            self._analyzing.discard(symbol)
+
+    def release(self, symbols):
+        """Lets the detectors fire again for symbols whose analysis failed, without a cooldown."""
+        self._analyzing.difference_update(symbols)
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_CACHE_TTL = float(os.getenv("SIGNAL_CACHE_TTL", "300"))
+SIGNAL_CACHE_SIZE = int(os.getenv("SIGNAL_CACHE_SIZE", "256"))
+SIGNAL_CACHE_PRICE_BUCKET = float(os.getenv("SIGNAL_CACHE_PRICE_BUCKET", "0.001")) # 0.1% wide buckets
+
+def price_bucket(price, width=SIGNAL_CACHE_PRICE_BUCKET):
+    """Maps a price to a bucket index; buckets are `width` wide in relative terms."""
+    return math.floor(math.log(price) / math.log1p(width))
+
+class SignalCache:
+    """
+    TTL + LRU cache for finished signals with single-flight coalescing:
+    concurrent requests for the same key share one in-flight computation.
+    Only successful results are cached; an error is handed to the callers
+    that were waiting on it and then forgotten.
+    """
+
+    def __init__(self, ttl=SIGNAL_CACHE_TTL, max_size=SIGNAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict() # key -> (expires_at, result, cost)
+        self._in_flight = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0,
+                      "saved_llm_calls": 0, "saved_seconds": 0.0}
+
+    async def get_or_compute(self, key, compute):
+        """
+        Returns the cached result for `key` or awaits `compute()`, which must
+        return (result, cost) where cost is a dict with 'llm_calls' and 'seconds'.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result, cost = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["saved_llm_calls"] += cost["llm_calls"]
+                self.stats["saved_seconds"] += cost["seconds"]
+                return dict(result)
+            del self._entries[key]
+
+        task = self._in_flight.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._compute(key, compute))
+            self._in_flight[key] = task
+        # Shield so one caller giving up does not cancel the work for the others.
+        result, cost = await asyncio.shield(task)
+        if coalesced:
+            self.stats["saved_llm_calls"] += cost["llm_calls"]
+        return dict(result)
+
+    async def _compute(self, key, compute):
+        try:
+            result, cost = await compute()
+            if "error" not in result:
+                self._entries[key] = (time.monotonic() + self.ttl, result, cost)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+            return result, cost
+        finally:
+            self._in_flight.pop(key, None)
+
+    def cache_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "saved_seconds": round(self.stats["saved_seconds"], 1),
+            "size": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 3) if lookups else 0.0,
+        }
@@ -1,7 +1,56 @@
+import os
 import re
+import time
 import asyncio
-from binance_api import get_candles, get_current_price
+from binance_api import get_candles, get_candle_arrays, get_current_price
 from groq_agent import get_llm_analysis
+from candle_store import CANDLE_STORE_CAPACITY, timeframe_to_ms
+from indicators import compute_features, resample_ohlcv, tail, trend_summary
+from llm_stream import MALFORMED_RESPONSE
+from metrics import (COMPONENT_STATS, SIGNAL_ATTEMPTS, SIGNAL_DEADLINES, SIGNAL_HEDGES, SIGNAL_REJECTIONS,
+                     SIGNAL_RETRIES, SIGNALS, STAGE_SECONDS)
+from signal_cache import SignalCache, price_bucket
+from work_scheduler import BUSY_ERROR, SchedulerBusy, work_scheduler
+
+# 'features' sends a compact local indicator summary to the LLM; 'raw' sends the candles themselves;
+# 'mtf' adds trend summaries of higher timeframes to the features.
+PROMPT_MODE = os.getenv("LLM_PROMPT_MODE", "features")
+# Indicators need more history than the LLM ever sees, so features mode fetches a longer window.
+# mtf fetches as much of the finest timeframe as the candle store holds, to build the coarser bars from it.
+CANDLE_LIMITS = {"features": 100, "raw": 50, "mtf": CANDLE_STORE_CAPACITY}
+# Signals are always analysed on this timeframe.
+SIGNAL_TIMEFRAME = '1h'
+# Timeframes used in mtf mode, finest first. Only the finest is fetched; the others are resampled from it.
+MTF_TIMEFRAMES = sorted({SIGNAL_TIMEFRAME, *filter(None, os.getenv("MTF_TIMEFRAMES", "1h,4h,1d").replace(" ", "").split(","))},
+                        key=timeframe_to_ms)
+# Entries further than this from the live price are limit orders (PENDING), the rest MARKET.
+PENDING_THRESHOLD = 0.005
+# If an LLM attempt has not answered after this many seconds, race a second identical one (0 disables).
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+# Overall budget for generating one signal, retries and hedges included.
+SIGNAL_DEADLINE = float(os.getenv("SIGNAL_DEADLINE", "45"))
+# Pause before retrying after an API error (validation failures are retried at once, with feedback).
+RETRY_DELAY = 2
+
+# validate_analysis rejections, keyed by a short reason used as a metrics label.
+VALIDATION_ERRORS = {
+    "missing_fields": "LLM response is missing required fields.",
+    "invalid_price": "Invalid price format in LLM response after cleaning.",
+    "invalid_buy": "Invalid BUY signal logic.",
+    "invalid_sell": "Invalid SELL signal logic.",
+}
+VALIDATION_REASONS = {message: reason for reason, message in VALIDATION_ERRORS.items()}
+# What to tell the LLM after each kind of rejection.
+VALIDATION_HINTS = {
+    "missing_fields": "Reply with a JSON object containing action, entry, take_profit, stop_loss, confidence and reason.",
+    "invalid_price": "entry, take_profit and stop_loss must be plain numbers.",
+    "invalid_buy": "For a BUY, take_profit must be above entry and stop_loss must be below entry.",
+    "invalid_sell": "For a SELL, take_profit must be below entry and stop_loss must be above entry.",
+    "malformed": "Reply with a single JSON object using exactly the requested fields and types.",
+}
+
+signal_cache = SignalCache()
+COMPONENT_STATS.add_source("signal_cache", lambda: signal_cache.cache_stats())
 
 def clean_price(price_str):
     """Removes non-numeric characters from a price string."""
@@ -10,67 +59,222 @@ def clean_price(price_str):
     cleaned_str = re.sub(r"[^\d.]", "", str(price_str))
     return float(cleaned_str) if cleaned_str else 0.0
 
-async def get_trading_signal(symbol='BTC/USDT', max_retries=3):
+async def get_trading_signal(symbol='BTC/USDT', max_retries=3, priority="interactive", user=None):
     """
     Orchestrates fetching data, getting LLM analysis, validating it,
     and returning the final, classified trading signal with a confidence note.
+    Cache misses wait for a work_scheduler slot in `priority`'s class
+    (fair-queued per `user`) before the LLM is asked.
     """
-    candles = await get_candles(symbol)
+    with STAGE_SECONDS.time(stage="total"):
+        return await _get_trading_signal(symbol, max_retries, priority, user)
+
+async def _get_trading_signal(symbol, max_retries, priority, user):
+    limit = CANDLE_LIMITS.get(PROMPT_MODE, 50)
+    # Features and mtf modes work directly on the candle store's column views.
+    with STAGE_SECONDS.time(stage="candles"):
+        if PROMPT_MODE == "mtf":
+            candles = await get_candle_arrays(symbol, time_frame=MTF_TIMEFRAMES[0], limit=limit)
+        elif PROMPT_MODE == "features":
+            candles = await get_candle_arrays(symbol, limit=limit)
+        else:
+            candles = await get_candles(symbol, limit=limit)
     if "error" in candles:
+        SIGNALS.inc(outcome="data_error")
         return candles
 
-    current_price = await get_current_price(symbol)
+    with STAGE_SECONDS.time(stage="ticker"):
+        current_price = await get_current_price(symbol)
     if isinstance(current_price, dict) and "error" in current_price:
+        SIGNALS.inc(outcome="data_error")
         return current_price
 
-    for attempt in range(max_retries):
-        analysis = await get_llm_analysis(candles, current_price)
-        if "error" in analysis:
-            if attempt == max_retries - 1:
-                return analysis
-            await asyncio.sleep(2)
-            continue
-
-        required_keys = ["action", "entry", "take_profit", "stop_loss", "confidence", "reason"]
-        if not all(key in analysis for key in required_keys):
-            if attempt == max_retries - 1:
-                return {"error": "LLM response is missing required fields."}
-            await asyncio.sleep(2)
-            continue
+    # The forming candle is excluded: the key changes once per closed candle, or when the price moves a bucket.
+    if PROMPT_MODE in ("features", "mtf"):
+        last_closed = int(candles["timestamp"][-2 if len(candles["timestamp"]) > 1 else -1])
+    else:
+        last_closed = candles[-2 if len(candles) > 1 else -1]["timestamp"]
+    cache_key = (symbol, PROMPT_MODE, last_closed, price_bucket(current_price))
 
+    ran = False
+
+    async def compute():
+        nonlocal ran
+        ran = True
+        started = time.monotonic()
         try:
-            analysis['entry'] = clean_price(analysis['entry'])
-            analysis['take_profit'] = clean_price(analysis['take_profit'])
-            analysis['stop_loss'] = clean_price(analysis['stop_loss'])
-        except (ValueError, TypeError):
-            if attempt == max_retries - 1:
-                return {"error": "Invalid price format in LLM response after cleaning."}
-            await asyncio.sleep(2)
-            continue
-
-        if analysis['action'] == 'BUY' and (analysis['take_profit'] <= analysis['entry'] or analysis['stop_loss'] >= analysis['entry']):
-            if attempt == max_retries - 1:
-                return {"error": "Invalid BUY signal logic."}
-            await asyncio.sleep(2)
-            continue
-        
-        if analysis['action'] == 'SELL' and (analysis['take_profit'] >= analysis['entry'] or analysis['stop_loss'] <= analysis['entry']):
-            if attempt == max_retries - 1:
-                return {"error": "Invalid SELL signal logic."}
-            await asyncio.sleep(2)
-            continue
-
-        price_diff_percentage = abs(analysis['entry'] - current_price) / current_price
-        analysis['signal_type'] = 'PENDING' if price_diff_percentage > 0.005 else 'MARKET'
-
-        # Add context-aware confidence note if below threshold
-        if analysis['confidence'] < 0.70:
-            if analysis['action'] == 'BUY':
-                analysis['confidence_note'] = "Low confidence – Entry should only be acted on after bullish confirmation (e.g., a strong green candle closing above a key level)."
-            elif analysis['action'] == 'SELL':
-                analysis['confidence_note'] = "Low confidence – Entry should only be acted on after bearish confirmation (e.g., a strong red candle closing below a key level)."
-
-        analysis['live_price'] = current_price
-        return analysis
-
-    return {"error": "Failed to generate a valid signal after multiple retries."}
\ No newline at end of file
+            async with work_scheduler.slot(priority, user):
+                if PROMPT_MODE == "features":
+                    with STAGE_SECONDS.time(stage="features"):
+                        market_data = compute_features(candles, current_price)
+                elif PROMPT_MODE == "mtf":
+                    with STAGE_SECONDS.time(stage="features"):
+                        market_data = multi_timeframe_features(candles, current_price)
+                else:
+                    market_data = candles
+                signal, llm_calls = await analyze_market(market_data, current_price, max_retries)
+        except SchedulerBusy as e:
+            SIGNALS.inc(outcome="busy")
+            return {"error": str(e)}, {"llm_calls": 0, "seconds": time.monotonic() - started}
+        if "error" in signal:
+            SIGNALS.inc(outcome="error")
+        else:
+            SIGNALS.inc(outcome=signal["signal_type"] if signal["action"] in ("BUY", "SELL") else "HOLD")
+        return signal, {"llm_calls": llm_calls, "seconds": time.monotonic() - started}
+
+    signal = await signal_cache.get_or_compute(cache_key, compute)
+    if signal.get("error") == BUSY_ERROR and not ran:
+        # Joined a computation refused at its starter's priority; ask again at our own.
+        signal = await signal_cache.get_or_compute(cache_key, compute)
+    return signal
+
+def multi_timeframe_features(candles, current_price, timeframes=None):
+    """
+    compute_features for SIGNAL_TIMEFRAME plus a trend_summary of every other
+    timeframe under "timeframes". `candles` are column arrays of the finest
+    timeframe (timeframes[0]); the coarser bars are resampled from them
+    locally, so one fetch serves every timeframe.
+    """
+    timeframes = timeframes or MTF_TIMEFRAMES
+    source_ms = timeframe_to_ms(timeframes[0])
+    frames = {
+        timeframe: candles if timeframe == timeframes[0] else resample_ohlcv(candles, source_ms, timeframe_to_ms(timeframe))
+        for timeframe in timeframes
+    }
+    features = compute_features(tail(frames[SIGNAL_TIMEFRAME], CANDLE_LIMITS["features"]), current_price)
+    features["timeframes"] = {
+        timeframe: trend_summary(bars, current_price) for timeframe, bars in frames.items() if timeframe != SIGNAL_TIMEFRAME
+    }
+    return features
+
+async def analyze_market(market_data, current_price, max_retries=3, deadline=None, hedge_after=None):
+    """
+    Asks the LLM for a signal, validating and retrying until it is sound.
+    A rejected answer is retried straight away with the validation failure
+    fed back into the prompt. If `hedge_after` seconds pass without an answer
+    a second, identical attempt is raised against the first and whichever
+    valid answer lands first wins. Everything must finish within `deadline`
+    seconds. Returns (signal, number of LLM calls made).
+    """
+    deadline = SIGNAL_DEADLINE if deadline is None else deadline
+    hedge_after = LLM_HEDGE_AFTER if hedge_after is None else hedge_after
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline_at = started + deadline
+    llm_calls = 0
+    feedback = None
+    hedges = set()
+    running = set()
+    analysis = {"error": "Failed to generate a valid signal after multiple retries."}
+
+    def launch(hedge=False):
+        nonlocal llm_calls
+        llm_calls += 1
+        task = asyncio.ensure_future(_attempt(market_data, current_price, feedback))
+        running.add(task)
+        if hedge:
+            hedges.add(task)
+            SIGNAL_HEDGES.inc(outcome="launched")
+
+    try:
+        launch()
+        while running:
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                break
+            can_hedge = hedge_after > 0 and len(running) == 1 and llm_calls < max_retries
+            done, _ = await asyncio.wait(running, timeout=min(remaining, hedge_after) if can_hedge else remaining,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if can_hedge:
+                    launch(hedge=True)
+                continue
+
+            for task in done:
+                running.discard(task)
+                result, reason, proposal = task.result()
+                if reason is None:
+                    if task in hedges:
+                        SIGNAL_HEDGES.inc(outcome="won")
+                    return result, llm_calls
+                analysis = result
+                if reason != "llm_error":
+                    feedback = _feedback(result["error"], reason, proposal)
+            if running or llm_calls >= max_retries:
+                continue # Wait for the other attempt, or give up once none is left.
+
+            SIGNAL_RETRIES.inc(reason=reason)
+            if reason == "llm_error":
+                with STAGE_SECONDS.time(stage="retry_backoff"):
+                    await asyncio.sleep(min(RETRY_DELAY, max(0.0, deadline_at - loop.time())))
+            if loop.time() < deadline_at:
+                launch()
+
+        if running or (loop.time() >= deadline_at and llm_calls < max_retries):
+            SIGNAL_DEADLINES.inc()
+            analysis = {"error": f"No valid signal within the {deadline:g}s deadline."}
+        return analysis, llm_calls
+    finally:
+        for task in running:
+            task.cancel()
+        SIGNAL_ATTEMPTS.observe(llm_calls)
+        STAGE_SECONDS.observe(loop.time() - started, stage="generation")
+
+async def _attempt(market_data, current_price, feedback):
+    """One LLM call plus validation. Returns (signal or error, failure reason or None, the raw answer)."""
+    with STAGE_SECONDS.time(stage="llm"):
+        proposal = await get_llm_analysis(market_data, current_price, feedback)
+    if "error" in proposal:
+        if proposal["error"].startswith(MALFORMED_RESPONSE):
+            # Streamed output cut off as unusable: retry with feedback like a validation failure.
+            SIGNAL_REJECTIONS.inc(reason="malformed")
+            return proposal, "malformed", {}
+        return proposal, "llm_error", proposal
+    with STAGE_SECONDS.time(stage="validation"):
+        analysis = validate_analysis(proposal, current_price)
+    if "error" not in analysis:
+        return analysis, None, proposal
+    reason = VALIDATION_REASONS.get(analysis["error"], "other")
+    SIGNAL_REJECTIONS.inc(reason=reason)
+    return analysis, reason, proposal
+
+def _feedback(error, reason, proposal):
+    fields = ", ".join(f"{key} {proposal[key]}" for key in ("action", "entry", "take_profit", "stop_loss") if key in proposal)
+    previous = f"Your previous answer ({fields})" if fields else "Your previous answer"
+    return f"{previous} was rejected: {error} {VALIDATION_HINTS.get(reason, '')}".strip()
+
+def validate_analysis(analysis, current_price):
+    """
+    Checks an LLM analysis for required fields and sane TP/SL placement, then
+    classifies it as a MARKET or PENDING signal. Returns the signal, or an
+    {"error": ...} dict naming the first problem found.
+    """
+    required_keys = ["action", "entry", "take_profit", "stop_loss", "confidence", "reason"]
+    if not all(key in analysis for key in required_keys):
+        return {"error": VALIDATION_ERRORS["missing_fields"]}
+
+    try:
+        analysis['entry'] = clean_price(analysis['entry'])
+        analysis['take_profit'] = clean_price(analysis['take_profit'])
+        analysis['stop_loss'] = clean_price(analysis['stop_loss'])
+    except (ValueError, TypeError):
+        return {"error": VALIDATION_ERRORS["invalid_price"]}
+
+    if analysis['action'] == 'BUY' and (analysis['take_profit'] <= analysis['entry'] or analysis['stop_loss'] >= analysis['entry']):
+        return {"error": VALIDATION_ERRORS["invalid_buy"]}
+
+    if analysis['action'] == 'SELL' and (analysis['take_profit'] >= analysis['entry'] or analysis['stop_loss'] <= analysis['entry']):
+        return {"error": VALIDATION_ERRORS["invalid_sell"]}
+
+    price_diff_percentage = abs(analysis['entry'] - current_price) / current_price
+    analysis['signal_type'] = 'PENDING' if price_diff_percentage > PENDING_THRESHOLD else 'MARKET'
+
+    # Add context-aware confidence note if below threshold
+    if analysis['confidence'] < 0.70:
+        if analysis['action'] == 'BUY':
+            analysis['confidence_note'] = "Low confidence – Entry should only be acted on after bullish confirmation (e.g., a strong green candle closing above a key level)."
+        elif analysis['action'] == 'SELL':
+            analysis['confidence_note'] = "Low confidence – Entry should only be acted on after bearish confirmation (e.g., a strong red candle closing below a key level)."
+
+    analysis['live_price'] = current_price
+    return analysis
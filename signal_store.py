@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_DB_PATH = os.getenv("SIGNAL_DB_PATH", "signals.db")
+RECENT_SIGNALS_SIZE = int(os.getenv("RECENT_SIGNALS_SIZE", "500"))
+FLUSH_INTERVAL = 1.0
+FLUSH_BATCH_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER,
+    symbol TEXT NOT NULL,
+    action TEXT NOT NULL,
+    signal_type TEXT,
+    entry REAL,
+    take_profit REAL,
+    stop_loss REAL,
+    confidence REAL,
+    reason TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS signals_by_chat ON signals (chat_id, id);
+CREATE INDEX IF NOT EXISTS signals_by_symbol ON signals (symbol, id);
+CREATE TABLE IF NOT EXISTS pending_signals (
+    id TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    entry REAL NOT NULL,
+    action TEXT NOT NULL,
+    message_id INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id INTEGER PRIMARY KEY
+);
+"""
+SIGNAL_COLUMNS = ("chat_id", "symbol", "action", "signal_type", "entry", "take_profit", "stop_loss", "confidence", "reason", "created_at")
+PENDING_COLUMNS = ("id", "chat_id", "symbol", "entry", "action", "message_id", "created_at")
+
+class SignalStore:
+    """
+    SQLite (WAL) persistence for signal history, monitored trades and alert
+    subscribers. Writes are queued and flushed in batches on a dedicated
+    thread, so handlers never block on disk. The most recent signals are also
+    kept in a bounded in-memory ring buffer.
+    """
+
+    def __init__(self, path=SIGNAL_DB_PATH, recent_size=RECENT_SIGNALS_SIZE):
+        self.path = path
+        self.recent = deque(maxlen=recent_size)
+        self._writes = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="signal-store")
+        self._conn = None
+        self._flush_task = None
+
+    # --- Lifecycle ---
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    async def _run(self, func, *args):
+        # Every database call runs on the store's single thread.
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def start(self):
+        await self._run(self._open)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    # --- Batched Writes ---
+    def _queue_write(self, sql, params):
+        self._writes.append((sql, params))
+        if len(self._writes) >= FLUSH_BATCH_SIZE and self._conn is not None:
+            asyncio.get_running_loop().create_task(self.flush())
+
+    def _execute_batch(self, writes):
+        with self._conn:
+            for sql, params in writes:
+                self._conn.execute(sql, params)
+
+    async def flush(self):
+        """Writes every queued change in one transaction."""
+        if not self._writes or self._conn is None:
+            return
+        writes, self._writes = self._writes, []
+        try:
+            await self._run(self._execute_batch, writes)
+        except Exception as e:
+            logger.error(f"Failed to persist {len(writes)} signal store writes: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+    # --- Signal History ---
+    def record_signal(self, signal_data, chat_id=None):
+        """Adds a generated signal to the recent buffer and queues it for storage."""
+        row = {column: signal_data.get(column) for column in SIGNAL_COLUMNS}
+        row["chat_id"] = chat_id
+        row["created_at"] = time.time()
+        self.recent.append(row)
+        placeholders = ", ".join("?" for _ in SIGNAL_COLUMNS)
+        self._queue_write(f"INSERT INTO signals ({', '.join(SIGNAL_COLUMNS)}) VALUES ({placeholders})",
+                          tuple(row[column] for column in SIGNAL_COLUMNS))
+
+    def _query_history(self, chat_id, symbol, limit):
+        clauses, params = [], []
+        if chat_id is not None:
+            clauses.append("chat_id = ?")
+            params.append(chat_id)
+        if symbol is not None:
+            clauses.append("symbol = ?")
+            params.append(symbol)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn.execute(f"SELECT * FROM signals {where} ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    async def history(self, chat_id=None, symbol=None, limit=5):
+        """Returns the latest signals (oldest first), optionally for one chat and/or symbol."""
+        matches = [
+            row for row in self.recent
+            if (chat_id is None or row["chat_id"] == chat_id) and (symbol is None or row["symbol"] == symbol)
+        ]
+        # The ring buffer already covers recent activity; only go to disk if it is too short.
+        if len(matches) >= limit or self._conn is None:
+            return matches[-limit:]
+        await self.flush()
+        return await self._run(self._query_history, chat_id, symbol, limit)
+
+    # --- Monitored Trades ---
+    def add_pending(self, signal):
+        """Persists a monitored trade; assigns signal['id'] if it has none."""
+        signal.setdefault("id", uuid.uuid4().hex)
+        signal.setdefault("created_at", time.time())
+        placeholders = ", ".join("?" for _ in PENDING_COLUMNS)
+        self._queue_write(f"INSERT OR REPLACE INTO pending_signals ({', '.join(PENDING_COLUMNS)}) VALUES ({placeholders})",
+                          tuple(signal.get(column) for column in PENDING_COLUMNS))
+
+    def remove_pending(self, signal):
+        if "id" in signal:
+            self._queue_write("DELETE FROM pending_signals WHERE id = ?", (signal["id"],))
+
+    def _query_pending(self):
+        return [dict(row) for row in self._conn.execute("SELECT * FROM pending_signals ORDER BY created_at")]
+
+    async def load_pending(self):
+        """Returns every monitored trade that was still open at the last shutdown."""
+        return await self._run(self._query_pending)
+
+    # --- Subscribers ---
+    def add_subscriber(self, chat_id):
+        self._queue_write("INSERT OR IGNORE INTO subscribers (chat_id) VALUES (?)", (chat_id,))
+
+    def remove_subscriber(self, chat_id):
+        self._queue_write("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))
+
+    async def load_subscribers(self):
+        rows = await self._run(lambda: self._conn.execute("SELECT chat_id FROM subscribers").fetchall())
+        return {row["chat_id"] for row in rows}
+
+signal_store = SignalStore()
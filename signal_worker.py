@@ -0,0 +1,446 @@
+"""
+Runs signal generation and market scans in worker processes fed from a local
+job queue, so the Telegram frontend's event loop only handles updates.
+
+With WORKER_MODE=queue the frontend serves a job queue and a result queue
+over a multiprocessing manager and starts SIGNAL_WORKERS local worker
+processes. Workers on other machines can attach to the same queues:
+
+    WORKER_AUTHKEY=... python signal_worker.py --connect frontend-host:50070 --concurrency 4
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+
+from dotenv import load_dotenv
+
+import groq_agent
+from market_scanner import scan_market
+from metrics import COMPONENT_STATS, registry
+from signal_generator import SIGNAL_DEADLINE, get_trading_signal
+from work_scheduler import BUSY_ERROR, PRIORITIES
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WORKER_MODE = os.getenv("WORKER_MODE", "inline") # 'inline' runs jobs on the frontend's loop; 'queue' uses worker processes
+SIGNAL_WORKERS = int(os.getenv("SIGNAL_WORKERS", "2")) # Local worker processes in queue mode
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4")) # Jobs each worker runs at once
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "100")) # Jobs waiting for a worker before new ones are refused
+WORKER_QUEUE_HOST = os.getenv("WORKER_QUEUE_HOST", "127.0.0.1")
+WORKER_QUEUE_PORT = int(os.getenv("WORKER_QUEUE_PORT", "0")) # 0 picks a free port (local workers only)
+WORKER_AUTHKEY = os.getenv("WORKER_AUTHKEY") # Unset generates one per run (local workers only)
+# Seconds a job may take from submission to result, queueing included.
+JOB_TIMEOUTS = {"signal": SIGNAL_DEADLINE + 30, "scan": 900}
+SUPERVISE_INTERVAL = 5
+WORKER_STATS_INTERVAL = 5 # Seconds between a worker's metrics reports when it has no results to send
+
+# Job kinds a worker can run: name -> coroutine function. Results must be picklable.
+JOBS = {
+    "signal": get_trading_signal,
+    "scan": scan_market,
+}
+# Queue class of a job submitted without a priority= argument.
+JOB_PRIORITIES = {"signal": "interactive", "scan": "background"}
+
+class QueueManager(BaseManager):
+    pass
+
+class JobQueue:
+    """
+    Thread-safe queue of jobs waiting for a worker, served to the workers
+    over the manager. get() hands out jobs strictly by priority class and
+    round-robin across users within a class, as WorkScheduler does for
+    slots, so a /signal never waits behind queued scans. put_nowait raises
+    queue.Full beyond `maxsize` jobs.
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self._condition = threading.Condition()
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES} # user -> deque of jobs
+        self._queued = {} # job id -> (priority, user, job)
+        self._stops = 0
+
+    def qsize(self):
+        return len(self._queued)
+
+    def put_nowait(self, job, priority, user=None):
+        with self._condition:
+            if self.maxsize and len(self._queued) >= self.maxsize:
+                raise queue.Full
+            self._add(job, priority, user)
+            self._condition.notify()
+
+    def stop_worker(self):
+        """Makes one waiting get() return None, which tells that worker to exit."""
+        with self._condition:
+            self._stops += 1
+            self._condition.notify()
+
+    def get(self):
+        with self._condition:
+            while True:
+                if self._stops:
+                    self._stops -= 1
+                    return None
+                for priority in PRIORITIES:
+                    waiting = self._queues[priority]
+                    if not waiting:
+                        continue
+                    # Oldest job of the user at the front, then that user moves to the back.
+                    user, jobs = next(iter(waiting.items()))
+                    job = jobs.popleft()
+                    if jobs:
+                        waiting.move_to_end(user)
+                    else:
+                        del waiting[user]
+                    del self._queued[job["id"]]
+                    return job
+                self._condition.wait()
+
+    def upgrade(self, job_id, priority, user=None):
+        """Moves a still-queued job up to `priority` for `user`. Returns True if it moved."""
+        with self._condition:
+            entry = self._queued.get(job_id)
+            if entry is None or PRIORITIES.index(priority) >= PRIORITIES.index(entry[0]):
+                return False
+            self._remove(*entry)
+            job = entry[2]
+            if job["kind"] == "signal":
+                job["kwargs"].update(priority=priority, user=user) # So the worker's scheduler sees it too
+            self._add(job, priority, user)
+            return True
+
+    def discard(self, job_id):
+        """Drops a job nobody is waiting for any more."""
+        with self._condition:
+            entry = self._queued.get(job_id)
+            if entry is not None:
+                self._remove(*entry)
+
+    def _add(self, job, priority, user):
+        self._queues[priority].setdefault(user, deque()).append(job)
+        self._queued[job["id"]] = (priority, user, job)
+
+    def _remove(self, priority, user, job):
+        jobs = self._queues[priority][user]
+        jobs.remove(job)
+        if not jobs:
+            del self._queues[priority][user]
+        del self._queued[job["id"]]
+
+# --- Shared LLM Budget ---
+class LLMBudget:
+    """
+    Frontend side of the LLM rate limit in queue mode: workers take and return
+    groq_agent.llm_limiter reservations through the job queue's manager, so
+    the Groq request/token limits hold for all workers together. Methods run
+    in the manager's connection threads.
+    """
+
+    def __init__(self, loop, lease):
+        self.loop = loop
+        self.lease = lease
+        self._reservations = {}
+        self._ids = itertools.count(1)
+
+    def acquire(self, prompt_tokens):
+        reservation = asyncio.run_coroutine_threadsafe(groq_agent.llm_limiter.acquire(prompt_tokens), self.loop).result()
+        reservation_id = next(self._ids)
+        self._reservations[reservation_id] = reservation
+        # Frees the slot if the worker dies before releasing it.
+        self.loop.call_soon_threadsafe(self.loop.call_later, self.lease, self.release, reservation_id)
+        return reservation_id
+
+    def release(self, reservation_id, used_tokens=None):
+        reservation = self._reservations.pop(reservation_id, None)
+        if reservation is not None:
+            self.loop.call_soon_threadsafe(groq_agent.llm_limiter.release, reservation, used_tokens)
+
+    def back_off(self, seconds):
+        self.loop.call_soon_threadsafe(groq_agent.llm_limiter.back_off, seconds)
+
+class RemoteLLMLimiter:
+    """Worker-side stand-in for groq_agent.llm_limiter that draws on the frontend's LLMBudget."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        # Proxy calls block, and acquire can wait a while for budget.
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-budget")
+
+    async def acquire(self, prompt_tokens):
+        call = self._executor.submit(self.budget.acquire, prompt_tokens)
+        try:
+            return await asyncio.shield(asyncio.wrap_future(call))
+        except asyncio.CancelledError:
+            # A losing hedge gave up while waiting; return the budget once it is granted.
+            call.add_done_callback(lambda done: done.exception() is None and self.release(done.result()))
+            raise
+
+    def release(self, reservation, used_tokens=None):
+        self._executor.submit(self.budget.release, reservation, used_tokens)
+
+    def back_off(self, seconds):
+        self._executor.submit(self.budget.back_off, seconds)
+
+# --- Worker ---
+def worker_report(name):
+    """Metrics recorded since the last report plus current component stats, for the frontend to merge."""
+    # The frontend's limiter already reports LLM budget use for all workers.
+    stats = {key: value for key, value in COMPONENT_STATS.read().items() if key[0] != "llm"}
+    return {"worker": name, "metrics": registry.collect(), "stats": stats}
+
+async def run_worker(address, authkey, concurrency=WORKER_CONCURRENCY, name=None):
+    """Takes jobs from the frontend's queue and posts results back until told to stop or disconnected."""
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    QueueManager.register("jobs")
+    QueueManager.register("results")
+    QueueManager.register("llm_budget")
+    manager = QueueManager(address=address, authkey=authkey)
+    manager.connect()
+    jobs, results = manager.jobs(), manager.results()
+    groq_agent.llm_limiter = RemoteLLMLimiter(manager.llm_budget())
+    COMPONENT_STATS.sources.pop("llm", None)
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    logger.info(f"Worker {name} connected to {address[0]}:{address[1]}")
+
+    async def report_periodically():
+        while True:
+            await asyncio.sleep(WORKER_STATS_INTERVAL)
+            await loop.run_in_executor(None, results.put, (None, None, worker_report(name)))
+
+    async def handle(job):
+        try:
+            remaining = job["deadline"] - time.time()
+            if remaining <= 0:
+                result = {"error": "The request expired before a worker was free."}
+            else:
+                try:
+                    result = await asyncio.wait_for(JOBS[job["kind"]](*job["args"], **job["kwargs"]), remaining)
+                except asyncio.TimeoutError:
+                    result = {"error": "The request timed out."}
+                except Exception as e:
+                    logger.error(f"Job {job['kind']}{job['args']} failed: {e}")
+                    result = {"error": f"Worker failed: {e}"}
+            await loop.run_in_executor(None, results.put, (job["id"], result, worker_report(name)))
+        finally:
+            slots.release()
+
+    reporter = asyncio.create_task(report_periodically())
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                job = await loop.run_in_executor(None, jobs.get)
+            except (EOFError, ConnectionError):
+                logger.info("Job queue closed; worker exiting.")
+                break
+            if job is None:
+                break
+            task = asyncio.create_task(handle(job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+        if running:
+            await asyncio.wait(running)
+    finally:
+        reporter.cancel()
+        from binance_api import close_exchange
+        await close_exchange()
+
+def worker_main(address, authkey, concurrency=WORKER_CONCURRENCY, name=None):
+    """Entry point of a worker process."""
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    try:
+        asyncio.run(run_worker(address, authkey, concurrency, name))
+    except KeyboardInterrupt:
+        pass
+
+# --- Frontend ---
+class WorkerPool:
+    """
+    Frontend side of the job queue. `run(kind, *args, **kwargs)` returns the job's
+    result, or an {"error": ...} dict when the queue is full (backpressure)
+    or no result arrives within the job's timeout. Jobs are queued by their
+    `priority` and `user` arguments. Identical jobs already in flight, whoever
+    asked and at whatever priority, are shared rather than queued twice; a
+    shared job still waiting for a worker moves up to the highest priority
+    asking for it. Workers draw on this process's
+    LLM rate limiter and ship their metrics back with each result, so /stats
+    and /metrics cover them. In inline mode jobs simply run on the caller's
+    event loop.
+    """
+
+    def __init__(self, mode=WORKER_MODE, processes=SIGNAL_WORKERS, concurrency=WORKER_CONCURRENCY,
+                 queue_size=WORKER_QUEUE_SIZE, host=WORKER_QUEUE_HOST, port=WORKER_QUEUE_PORT, authkey=WORKER_AUTHKEY,
+                 timeouts=JOB_TIMEOUTS):
+        self.mode = mode
+        self.processes = processes
+        self.concurrency = concurrency
+        self.address = (host, port)
+        self.authkey = authkey.encode() if authkey else secrets.token_bytes(32)
+        self.timeouts = timeouts
+        self._jobs = JobQueue(maxsize=queue_size)
+        self._results = queue.Queue()
+        self._pending = {} # job id -> future
+        self._in_flight = {} # job key -> (job id, future), for deduplication
+        self._ids = itertools.count(1)
+        self._workers = {} # slot -> local worker process
+        self._loop = None
+        self._supervisor = None
+        self.stats = {"submitted": 0, "deduplicated": 0, "upgraded": 0, "rejected": 0, "timed_out": 0,
+                      "completed": 0, "restarts": 0}
+
+    async def start(self):
+        if self.mode != "queue":
+            return
+        self._loop = asyncio.get_running_loop()
+        QueueManager.register("jobs", callable=lambda: self._jobs)
+        QueueManager.register("results", callable=lambda: self._results)
+        llm_budget = LLMBudget(self._loop, lease=max(self.timeouts.values()))
+        QueueManager.register("llm_budget", callable=lambda: llm_budget)
+        server = QueueManager(address=self.address, authkey=self.authkey).get_server()
+        self.address = server.address
+        threading.Thread(target=server.serve_forever, name="worker-queue", daemon=True).start()
+        threading.Thread(target=self._read_results, name="worker-results", daemon=True).start()
+        for slot in range(1, self.processes + 1):
+            self._spawn(slot)
+        self._supervisor = asyncio.create_task(self._supervise())
+        logger.info(f"Serving the job queue on {self.address[0]}:{self.address[1]} with {self.processes} local workers.")
+
+    async def stop(self, join_timeout=5.0):
+        if self.mode != "queue" or self._loop is None:
+            return
+        self._supervisor.cancel()
+        for _ in self._workers:
+            self._jobs.stop_worker()
+        for process in self._workers.values():
+            await self._loop.run_in_executor(None, process.join, join_timeout)
+            if process.is_alive():
+                process.terminate()
+        self._workers = {}
+        self._results.put(None)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result({"error": "The bot is shutting down."})
+        self._pending.clear()
+        self._in_flight.clear()
+
+    async def run(self, kind, *args, **kwargs):
+        if self.mode != "queue":
+            return await JOBS[kind](*args, **kwargs)
+        priority = kwargs.get("priority", JOB_PRIORITIES.get(kind, "background"))
+        user = kwargs.get("user")
+        key = job_key(kind, args, kwargs)
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            job_id, future = shared
+            self.stats["deduplicated"] += 1
+            if self._jobs.upgrade(job_id, priority, user):
+                self.stats["upgraded"] += 1
+            return await asyncio.shield(future)
+
+        timeout = self.timeouts.get(kind, SIGNAL_DEADLINE)
+        job_id = next(self._ids)
+        job = {"id": job_id, "kind": kind, "args": args, "kwargs": kwargs, "deadline": time.time() + timeout}
+        try:
+            self._jobs.put_nowait(job, priority, user)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            return {"error": BUSY_ERROR}
+        self.stats["submitted"] += 1
+        future = self._loop.create_future()
+        self._pending[job_id] = future
+        self._in_flight[key] = (job_id, future)
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        timer = self._loop.call_later(timeout, self._expire, job_id)
+        future.add_done_callback(lambda _: timer.cancel())
+        return await asyncio.shield(future)
+
+    def _expire(self, job_id):
+        self._jobs.discard(job_id)
+        future = self._pending.pop(job_id, None)
+        if future is not None and not future.done():
+            self.stats["timed_out"] += 1
+            future.set_result({"error": "No result from the signal workers in time."})
+
+    def _receive(self, job_id, result, report):
+        registry.merge(report["metrics"])
+        COMPONENT_STATS.update_remote(report["worker"], report["stats"])
+        if job_id is not None:
+            self._resolve(job_id, result)
+
+    def _resolve(self, job_id, result):
+        future = self._pending.pop(job_id, None)
+        if future is not None and not future.done():
+            self.stats["completed"] += 1
+            future.set_result(result)
+
+    def _read_results(self):
+        # Runs in a thread: hands results from worker processes to the event loop.
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+            self._loop.call_soon_threadsafe(self._receive, *item)
+
+    def _spawn(self, slot):
+        process = multiprocessing.get_context("spawn").Process(
+            target=worker_main, args=(self.address, self.authkey, self.concurrency, f"worker{slot}"), daemon=True)
+        process.start()
+        self._workers[slot] = process
+
+    async def _supervise(self):
+        # Replaces crashed local workers; their jobs fail by timeout.
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            for slot, process in list(self._workers.items()):
+                if process.is_alive():
+                    continue
+                logger.warning(f"Worker {process.pid} exited with code {process.exitcode}; starting a new one.")
+                self.stats["restarts"] += 1
+                self._spawn(slot)
+
+    def worker_stats(self):
+        """Counters plus queue depth, jobs in flight and live local workers."""
+        return {
+            **self.stats,
+            "queued": self._jobs.qsize(),
+            "pending": len(self._pending),
+            "workers_alive": sum(process.is_alive() for process in self._workers.values()),
+        }
+
+def job_key(kind, args, kwargs):
+    """What makes two jobs the same work: who asks (user) and how urgently (priority) do not."""
+    options = tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                           for name, value in kwargs.items() if name not in ("priority", "user")))
+    return kind, args, options
+
+worker_pool = WorkerPool()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connect", required=True, help="host:port of the frontend's job queue (WORKER_QUEUE_PORT)")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    if not WORKER_AUTHKEY:
+        parser.error("WORKER_AUTHKEY must be set to the frontend's key")
+    host, port = args.connect.rsplit(":", 1)
+    worker_main((host, int(port)), WORKER_AUTHKEY.encode(), args.concurrency)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
 import asyncio
 import logging
 import os
+import signal
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler, JobQueue
 from telegram.helpers import escape_markdown
 from dotenv import load_dotenv
 
-from signal_generator import get_trading_signal
-from binance_api import get_current_price # Import to get live price for monitoring
+from binance_api import get_candle_arrays, get_current_prices, exchange_manager, close_exchange, price_stream # Import to get live prices for monitoring
+from candle_store import timeframe_to_ms
+from price_triggers import PriceTriggerIndex
+from market_scanner import SCAN_CANDLE_LIMIT, SCAN_CONCURRENCY, get_scan_universe
+from scan_triggers import ScanTriggers
+from message_dispatcher import message_dispatcher
+from signal_store import signal_store
+from metrics import ALERT_DELAY_SECONDS, COMPONENT_STATS, SCAN_ANALYSES, metrics_server, stats_report, timed_job
+from webhook_server import WEBHOOK_SECRET, WEBHOOK_URL, WebhookServer
+from signal_worker import worker_pool
+from work_scheduler import BUSY_ERROR
 
 # Enable logging
 logging.basicConfig(
@@ -18,10 +29,24 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-
-# In-memory storage
-signal_history = []
-pending_signals = [] # For active monitoring
+PRICE_FEED = os.getenv("PRICE_FEED", "poll") # 'poll' or 'stream'
+UPDATE_MODE = os.getenv("UPDATE_MODE", "polling") # 'polling' or 'webhook'
+PROACTIVE_INTERVAL = 900 # Seconds between market scans
+# 'timer' scans the universe every PROACTIVE_INTERVAL; 'events' (needs PRICE_FEED=stream) scans on candle
+# closes and detector triggers, keeping the timer only for stream outages.
+SCAN_MODE = os.getenv("SCAN_MODE", "timer")
+SCAN_CLOSE_DELAY = 15 # Seconds to gather the universe's candle closes into one prescreen batch
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+# Signal history, monitored trades and subscribers are persisted by signal_store.
+pending_signals = PriceTriggerIndex() # For active monitoring, indexed by symbol
+deferred_signals = [] # Triggered while the bot was busy; back on watch at the next monitor pass
+scan_triggers = ScanTriggers()
+COMPONENT_STATS.add_source("scan_triggers", lambda: scan_triggers.stats)
+COMPONENT_STATS.add_source("dispatcher", lambda: message_dispatcher.dispatch_stats())
+COMPONENT_STATS.add_source("workers", worker_pool.worker_stats)
+COMPONENT_STATS.add_source("monitoring", lambda: {"pending": len(pending_signals), "symbols": len(pending_signals.symbols()),
+                                                   "deferred": len(deferred_signals)})
 
 # --- Helper Functions ---
 def get_action_emoji(action):
@@ -31,12 +56,21 @@ def get_action_emoji(action):
         return "📉"
     return "🤔"
 
+async def queued_reply(message, text, **kwargs):
+    """Replies to a message through the shared rate-limited dispatcher."""
+    return await message_dispatcher.submit(message.chat_id, lambda: message.reply_text(text, **kwargs))
+
+async def queued_edit(query, text, **kwargs):
+    """Edits a callback query's message through the shared rate-limited dispatcher."""
+    return await message_dispatcher.submit(query.message.chat_id, lambda: query.edit_message_text(text=text, **kwargs))
+
 # --- Bot Commands & Handlers ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends a welcome message and stores user chat_id."""
     if 'chat_ids' not in context.bot_data:
         context.bot_data['chat_ids'] = set()
     context.bot_data['chat_ids'].add(update.message.chat_id)
+    signal_store.add_subscriber(update.message.chat_id)
     
     keyboard = [
         [InlineKeyboardButton("📈 BTC/USDT", callback_data='BTC/USDT')],
@@ -44,7 +78,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         [InlineKeyboardButton("📈 SOL/USDT", callback_data='SOL/USDT')],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(
+    await queued_reply(
+        update.message,
         "👋 Welcome to the Advanced Crypto Signal Bot!\n\n" 
         "I'll send you proactive alerts and can now monitor pending trades for you.",
         reply_markup=reply_markup
@@ -66,17 +101,20 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             "action": parts[3],
             "message_id": query.message.message_id # Store message_id to update it later
         }
-        pending_signals.append(signal_to_monitor)
-        await query.edit_message_text(text=f"✅ Monitoring enabled for {parts[1]} at ${float(parts[2]):.2f}. I will alert you when the price is hit.")
+        pending_signals.add(signal_to_monitor)
+        signal_store.add_pending(signal_to_monitor)
+        if PRICE_FEED == 'stream':
+            price_stream.subscribe([signal_to_monitor['symbol']])
+        await queued_edit(query, f"✅ Monitoring enabled for {parts[1]} at ${float(parts[2]):.2f}. I will alert you when the price is hit.")
     
     elif '/' in data: # It's a currency pair
         await generate_signal(query.message, context, data)
     
     elif data == 'signal_helpful_yes':
-        await query.edit_message_text(text="😊 Great! Thanks for the feedback.")
+        await queued_edit(query, "😊 Great! Thanks for the feedback.")
     
     elif data == 'signal_helpful_no':
-        await query.edit_message_text(text="😔 Sorry to hear that. We are always improving.")
+        await queued_edit(query, "😔 Sorry to hear that. We are always improving.")
 
 async def signal_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /signal command."""
@@ -84,22 +122,25 @@ async def signal_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         symbol = context.args[0].upper() if context.args else 'BTC/USDT'
         await generate_signal(update.message, context, symbol)
     except (IndexError, ValueError):
-        await update.message.reply_text(escape_markdown('⚠️ Usage: /signal <PAIR>', version=2), parse_mode='MarkdownV2')
+        await queued_reply(update.message, escape_markdown('⚠️ Usage: /signal <PAIR>', version=2), parse_mode='MarkdownV2')
 
 async def generate_signal(source, context, symbol):
     """Generates and sends a trading signal."""
-    reply_func = source.edit_text if hasattr(source, 'edit_text') else source.reply_text
+    send_func = source.edit_text if hasattr(source, 'edit_text') else source.reply_text
+
+    async def reply_func(*args, **kwargs):
+        return await message_dispatcher.submit(source.chat_id, lambda: send_func(*args, **kwargs))
     
     try:
         await reply_func(escape_markdown(f"⏳ Generating signal for `{symbol}`, please wait...", version=2), parse_mode='MarkdownV2')
-        signal_data = await get_trading_signal(symbol)
+        signal_data = await worker_pool.run("signal", symbol, priority="interactive", user=source.chat_id)
         
         if "error" in signal_data:
             await reply_func(f"❌ Error: {escape_markdown(signal_data['error'], version=2)}")
             return
 
         signal_data['symbol'] = symbol
-        signal_history.append(signal_data)
+        signal_store.record_signal(signal_data, chat_id=source.chat_id)
         action_emoji = get_action_emoji(signal_data['action'])
 
         keyboard = [] # Start with an empty keyboard
@@ -136,13 +177,14 @@ async def generate_signal(source, context, symbol):
         await reply_func(escape_markdown("❌ An unexpected error occurred. Please try again.", version=2), parse_mode='MarkdownV2')
 
 async def history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Displays the last 5 trading signals."""
-    if not signal_history:
-        await update.message.reply_text("📜 No signals in history yet.")
+    """Displays this chat's last 5 trading signals."""
+    recent_signals = await signal_store.history(chat_id=update.message.chat_id, limit=5)
+    if not recent_signals:
+        await queued_reply(update.message, "📜 No signals in history yet.")
         return
 
-    await update.message.reply_text("*--- Last 5 Signals ---*", parse_mode='MarkdownV2')
-    for signal_data in signal_history[-5:]:
+    await queued_reply(update.message, "*--- Last 5 Signals ---*", parse_mode='MarkdownV2')
+    for signal_data in recent_signals:
         action_emoji = get_action_emoji(signal_data['action'])
         message = (
             f"{action_emoji} *{escape_markdown(signal_data.get('symbol', 'N/A'), version=2)}*\n"
@@ -150,16 +192,46 @@ async def history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             f"TP: ${escape_markdown(f'{signal_data['take_profit']:.2f}', version=2)} | SL: ${escape_markdown(f'{signal_data['stop_loss']:.2f}', version=2)}\n"
             f"Confidence: `{escape_markdown(f'{signal_data['confidence']:.2f}', version=2)}`"
         )
-        await update.message.reply_text(message, parse_mode='MarkdownV2')
+        await queued_reply(update.message, message, parse_mode='MarkdownV2')
 
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Shows pipeline timings, retries and component counters to admins."""
+    if update.effective_user is None or update.effective_user.id not in ADMIN_USER_IDS:
+        await queued_reply(update.message, "⛔ This command is only available to admins.")
+        return
+    await queued_reply(update.message, stats_report())
+
+@timed_job("proactive_signals")
 async def proactive_signals(context: ContextTypes.DEFAULT_TYPE):
     """Proactively sends high-confidence signals to all subscribed users."""
     if 'chat_ids' not in context.bot_data or not context.bot_data['chat_ids']:
         return
 
-    for symbol in ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']:
-        signal_data = await get_trading_signal(symbol)
-        await asyncio.sleep(10) # Add a 10-second delay to avoid rate limiting
+    if event_scanning() and price_stream.is_live():
+        return # Candle closes and detectors drive scanning; the timer only covers stream outages.
+
+    # The scanner pre-screens the whole universe locally and only sends the top candidates to the LLM.
+    report = await worker_pool.run("scan")
+    if "error" in report:
+        logger.warning(f"Market scan failed: {report['error']}")
+        return
+    if report["timings"]["total"] > PROACTIVE_INTERVAL:
+        logger.warning(f"Market scan took {report['timings']['total']:.0f}s, longer than the {PROACTIVE_INTERVAL}s scan interval.")
+    # The newest data a timer scan can act on is the last closed candle.
+    now = time.time()
+    last_close = now // 3600 * 3600
+    for _ in analyzed_symbols(report["signals"]):
+        SCAN_ANALYSES.inc(trigger="timer")
+        ALERT_DELAY_SECONDS.observe(now - last_close, trigger="timer")
+    send_alerts(context.bot_data, report["signals"])
+
+def analyzed_symbols(signals):
+    """Symbols among (symbol, signal) pairs that actually got a signal, not a busy or error reply."""
+    return [symbol for symbol, signal_data in signals if "error" not in signal_data]
+
+def send_alerts(bot_data, signals):
+    """Broadcasts the high-confidence signals among (symbol, signal) pairs to every subscriber."""
+    for symbol, signal_data in signals:
         if "error" not in signal_data and signal_data.get('confidence', 0) > 0.85:
             action_emoji = get_action_emoji(signal_data['action'])
             message = (
@@ -170,87 +242,277 @@ async def proactive_signals(context: ContextTypes.DEFAULT_TYPE):
                 f"💪 *Confidence:* `{escape_markdown(f'{signal_data['confidence']:.2f}', version=2)}`\n"
                 f"🧠 *Reason:* {escape_markdown(signal_data['reason'], version=2)}"
             )
-            for chat_id in context.bot_data['chat_ids']:
-                try:
-                    await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='MarkdownV2')
-                except Exception as e:
-                    logger.error(f"Failed to send proactive signal to {chat_id}: {e}")
+            # Rendered once, then fanned out by the dispatcher within Telegram's rate limits.
+            queued = message_dispatcher.broadcast(bot_data.get('chat_ids', ()), message, parse_mode='MarkdownV2')
+            logger.info(f"Queued {symbol} alert for {queued} chats.")
 
 # --- Monitoring Engine ---
+@timed_job("monitor_pending_signals")
 async def monitor_pending_signals(context: ContextTypes.DEFAULT_TYPE):
-    """Monitors pending signals and alerts user when entry price is hit."""
-    global pending_signals
-    signals_to_remove = []
-
-    for signal_to_monitor in pending_signals:
-        symbol = signal_to_monitor['symbol']
-        entry_price = signal_to_monitor['entry']
-        action = signal_to_monitor['action']
-        chat_id = signal_to_monitor['chat_id']
-        message_id = signal_to_monitor['message_id']
-
-        current_price = await get_current_price(symbol)
-        if isinstance(current_price, dict) and "error" in current_price:
-            logger.info(f"Error fetching current price for {symbol} during monitoring: {current_price['error']}")
-            continue # Skip to next signal if price fetch fails
-
-        price_hit = False
-        if action == 'BUY' and current_price <= entry_price:
-            price_hit = True
-        elif action == 'SELL' and current_price >= entry_price:
-            price_hit = True
-
-        if price_hit:
-            logger.info(f"Entry price hit for {symbol} ({action} at {entry_price}). Re-evaluating signal...")
-            # Re-evaluate the signal with fresh data
-            re_evaluated_signal = await get_trading_signal(symbol)
-
-            if "error" not in re_evaluated_signal and re_evaluated_signal['signal_type'] == 'MARKET':
-                # Trade confirmed
-                message = (
-                    f"✅ *TRADE CONFIRMED: {escape_markdown(symbol, version=2)}*\n\n"
-                    f"*Action:* `{re_evaluated_signal['action']}`\n"
-                    f"*Entry:* ${escape_markdown(f'{re_evaluated_signal["entry"]:.2f}', version=2)}\n"
-                    f"🎯 *Take Profit:* ${escape_markdown(f'{re_evaluated_signal["take_profit"]:.2f}', version=2)}\n"
-                    f"🛡️ *Stop Loss:* ${escape_markdown(f'{re_evaluated_signal["stop_loss"]:.2f}', version=2)}\n"
-                    f"💪 *Confidence:* `{escape_markdown(f'{re_evaluated_signal["confidence"]:.2f}', version=2)}`\n\n"
-                    f"*Reason:* {escape_markdown(re_evaluated_signal['reason'], version=2)}"
-                )
-                await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='MarkdownV2')
-                signals_to_remove.append(signal_to_monitor)
-            else:
-                # Signal invalidated or error during re-evaluation
-                reason = re_evaluated_signal.get('error', 'Indicators no longer align.')
-                message = (
-                    f"❌ *SIGNAL CANCELLED: {escape_markdown(symbol, version=2)}*\n\n"
-                    f"The entry price of ${escape_markdown(f'{entry_price:.2f}', version=2)} was hit, but the trade setup is no longer valid.\n"
-                    f"*Reason:* {escape_markdown(reason, version=2)}"
-                )
-                await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='MarkdownV2')
-                signals_to_remove.append(signal_to_monitor)
-
-    # Remove processed signals
-    for signal in signals_to_remove:
-        pending_signals.remove(signal)
+    """Monitors pending signals and alerts users when entry prices are hit."""
+    while deferred_signals:
+        pending_signals.add(deferred_signals.pop())
+    symbols = pending_signals.symbols()
+    if not symbols:
+        return
+
+    if PRICE_FEED == 'stream' and price_stream.is_live():
+        # Streamed symbols are handled as events; only poll the ones without fresh ticks.
+        symbols = {symbol for symbol in symbols if price_stream.fresh_price(symbol) is None}
+        if not symbols:
+            return
+
+    # One bulk ticker request per pass, however many users watch each symbol.
+    prices = await get_current_prices(symbols)
+    if "error" in prices:
+        logger.info(f"Error fetching prices during monitoring: {prices['error']}")
+        return
+
+    notifications = {}
+    for symbol in symbols:
+        current_price = prices.get(symbol)
+        if current_price is None:
+            continue
+        triggered = pending_signals.pop_triggered(symbol, current_price)
+        if triggered:
+            notifications[symbol] = notify_triggered_signals(symbol, triggered)
+    # Re-evaluations run side by side; the worker pool and scheduler bound how many reach the LLM.
+    results = await asyncio.gather(*notifications.values(), return_exceptions=True)
+    for symbol, result in zip(notifications, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to notify triggered {symbol} signals: {result}")
+
+async def notify_triggered_signals(symbol, triggered):
+    """Re-evaluates a symbol once and tells every watcher whose entry was hit."""
+    logger.info(f"Entry price hit for {len(triggered)} pending {symbol} signal(s). Re-evaluating signal...")
+    for signal_to_monitor in triggered:
+        signal_store.remove_pending(signal_to_monitor)
+    # Re-evaluate the signal with fresh data
+    re_evaluated_signal = await worker_pool.run("signal", symbol, priority="confirmation")
+    if re_evaluated_signal.get('error') == BUSY_ERROR:
+        # Deferred, not cancelled: the entries go back on watch at the next monitor pass rather than on
+        # the next stream tick, which would retry about once a second while the bot stays busy.
+        logger.info(f"Re-evaluation of {symbol} deferred, the bot is busy.")
+        for signal_to_monitor in triggered:
+            deferred_signals.append(signal_to_monitor)
+            signal_store.add_pending(signal_to_monitor)
+        return
+
+    if "error" not in re_evaluated_signal and re_evaluated_signal['signal_type'] == 'MARKET':
+        # Trade confirmed
+        message = (
+            f"✅ *TRADE CONFIRMED: {escape_markdown(symbol, version=2)}*\n\n"
+            f"*Action:* `{re_evaluated_signal['action']}`\n"
+            f"*Entry:* ${escape_markdown(f'{re_evaluated_signal["entry"]:.2f}', version=2)}\n"
+            f"🎯 *Take Profit:* ${escape_markdown(f'{re_evaluated_signal["take_profit"]:.2f}', version=2)}\n"
+            f"🛡️ *Stop Loss:* ${escape_markdown(f'{re_evaluated_signal["stop_loss"]:.2f}', version=2)}\n"
+            f"💪 *Confidence:* `{escape_markdown(f'{re_evaluated_signal["confidence"]:.2f}', version=2)}`\n\n"
+            f"*Reason:* {escape_markdown(re_evaluated_signal['reason'], version=2)}"
+        )
+        for signal_to_monitor in triggered:
+            message_dispatcher.send(signal_to_monitor['chat_id'], message, parse_mode='MarkdownV2')
+    else:
+        # Signal invalidated or error during re-evaluation
+        reason = re_evaluated_signal.get('error', 'Indicators no longer align.')
+        for signal_to_monitor in triggered:
+            message = (
+                f"❌ *SIGNAL CANCELLED: {escape_markdown(symbol, version=2)}*\n\n"
+                f"The entry price of ${escape_markdown(f'{signal_to_monitor["entry"]:.2f}', version=2)} was hit, but the trade setup is no longer valid.\n"
+                f"*Reason:* {escape_markdown(reason, version=2)}"
+            )
+            message_dispatcher.send(signal_to_monitor['chat_id'], message, parse_mode='MarkdownV2')
+
+def on_stream_price(application, symbol, price):
+    """Checks streamed prices against pending entries and, in event scan mode, the scan detectors."""
+    triggered = pending_signals.pop_triggered(symbol, price)
+    if triggered:
+        application.create_task(notify_triggered_signals(symbol, triggered))
+    if event_scanning() and application.bot_data.get('chat_ids'):
+        reason = scan_triggers.check_price(symbol, price)
+        if reason:
+            application.create_task(analyze_triggered_symbol(application, symbol, reason))
+
+# --- Event-Driven Scanning ---
+def event_scanning():
+    return SCAN_MODE == 'events' and PRICE_FEED == 'stream'
+
+def on_stream_kline(application, symbol, candle):
+    """Watches forming candles for volume spikes."""
+    if not application.bot_data.get('chat_ids'):
+        return
+    reason = scan_triggers.check_volume(symbol, candle['volume'])
+    if reason:
+        application.create_task(analyze_triggered_symbol(application, symbol, reason))
+
+def on_stream_candle_close(application, symbol, candle):
+    """Queues a closed candle; the first close of the hour schedules the batch prescreen."""
+    close_time = (candle['timestamp'] + timeframe_to_ms(price_stream.kline_interval)) / 1000
+    if scan_triggers.candle_closed(symbol, candle, close_time):
+        application.create_task(scan_closed_candles(application))
+
+async def analyze_triggered_symbol(application, symbol, reason):
+    """
+    Analyses one symbol a detector fired on, skipping the prescreen, and
+    alerts subscribers if it is strong. Only a signal starts the symbol's
+    cooldown; after a busy or error reply the detectors may fire again.
+    """
+    logger.info(f"Scan trigger {reason} on {symbol}.")
+    fired_at = time.time()
+    signal_data = None
+    try:
+        signal_data = await worker_pool.run("signal", symbol, priority="background")
+    finally:
+        if signal_data is None or "error" in signal_data:
+            scan_triggers.release([symbol])
+    if "error" in signal_data:
+        logger.info(f"Trigger analysis of {symbol} failed: {signal_data['error']}")
+        return
+    scan_triggers.mark_analyzed([symbol])
+    SCAN_ANALYSES.inc(trigger=reason)
+    ALERT_DELAY_SECONDS.observe(time.time() - fired_at, trigger=reason)
+    send_alerts(application.bot_data, [(symbol, signal_data)])
+
+async def scan_closed_candles(application):
+    """Prescreens the symbols whose candle just closed and analyses the best few, as a timer scan would."""
+    await asyncio.sleep(SCAN_CLOSE_DELAY)
+    closed = scan_triggers.take_closed()
+    if closed and application.bot_data.get('chat_ids'):
+        report = await worker_pool.run("scan", universe=list(closed))
+        if "error" in report:
+            logger.warning(f"Candle close scan failed: {report['error']}")
+        else:
+            now = time.time()
+            analyzed = analyzed_symbols(report["signals"])
+            scan_triggers.mark_analyzed(analyzed)
+            for symbol in analyzed:
+                SCAN_ANALYSES.inc(trigger="candle_close")
+                ALERT_DELAY_SECONDS.observe(now - closed[symbol], trigger="candle_close")
+            send_alerts(application.bot_data, report["signals"])
+    # Symbols that joined the universe since startup get their detector levels now.
+    await prime_scan_triggers([symbol for symbol in closed if not scan_triggers.is_primed(symbol)])
+
+async def prime_scan_triggers(symbols):
+    """Seeds the scan detectors' reference levels from the candle store."""
+    semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+
+    async def prime(symbol):
+        async with semaphore:
+            candles = await get_candle_arrays(symbol, limit=SCAN_CANDLE_LIMIT)
+        if "error" not in candles:
+            scan_triggers.prime(symbol, candles)
+
+    await asyncio.gather(*(prime(symbol) for symbol in symbols))
+
+# --- Application Lifecycle ---
+def forget_chat(application, chat_id):
+    """Stops proactive alerts to a chat that blocked the bot or no longer exists."""
+    application.bot_data.get('chat_ids', set()).discard(chat_id)
+    signal_store.remove_subscriber(chat_id)
+    logger.info(f"Removed chat {chat_id} from alert subscribers.")
+
+async def on_startup(application: Application) -> None:
+    """Starts the message dispatcher, metrics endpoint, signal workers and signal store, the shared exchange client and, in stream mode, the price stream."""
+    message_dispatcher.on_blocked = lambda chat_id: forget_chat(application, chat_id)
+    await message_dispatcher.start(application.bot)
+    await metrics_server.start()
+    await worker_pool.start()
+
+    # Restore subscribers and monitored trades from the last run.
+    await signal_store.start()
+    application.bot_data.setdefault('chat_ids', set()).update(await signal_store.load_subscribers())
+    for signal_to_monitor in await signal_store.load_pending():
+        pending_signals.add(signal_to_monitor)
+    logger.info(f"Restored {len(application.bot_data['chat_ids'])} subscribers and {len(pending_signals)} monitored trades.")
+
+    try:
+        await exchange_manager.get_exchange()
+    except Exception as e:
+        # Not fatal: the client is opened lazily on the first market data call.
+        logger.warning(f"Could not warm up exchange client: {e}")
+
+    if PRICE_FEED == 'stream':
+        universe = await get_scan_universe()
+        price_stream.on_price = lambda symbol, price: on_stream_price(application, symbol, price)
+        price_stream.subscribe(universe, klines=True)
+        price_stream.subscribe(pending_signals.symbols())
+        if event_scanning():
+            price_stream.on_kline = lambda symbol, candle: on_stream_kline(application, symbol, candle)
+            price_stream.on_candle_close = lambda symbol, candle: on_stream_candle_close(application, symbol, candle)
+            application.create_task(prime_scan_triggers(universe))
+        await price_stream.start()
+    elif SCAN_MODE == 'events':
+        logger.warning("SCAN_MODE=events needs PRICE_FEED=stream; scanning on the timer instead.")
+
+async def on_shutdown(application: Application) -> None:
+    """Stops the price stream and signal workers, drains queued messages, flushes the signal store and closes the shared exchange client."""
+    await price_stream.stop()
+    await worker_pool.stop()
+    await message_dispatcher.stop()
+    await signal_store.close()
+    await metrics_server.stop()
+    await close_exchange()
+
+async def run_webhook(application: Application) -> None:
+    """
+    Runs the bot on the webhook server instead of long polling, until SIGINT
+    or SIGTERM. The webhook stays registered on exit so Telegram holds
+    updates for the next start.
+    """
+    webhook_server = WebhookServer(application)
+    COMPONENT_STATS.add_source("webhook", webhook_server.webhook_stats)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(stop_signal, stop.set)
+
+    await application.initialize()
+    try:
+        await on_startup(application)
+        await application.start()
+        await webhook_server.start()
+        if WEBHOOK_URL:
+            await webhook_server.register(WEBHOOK_URL)
+        await stop.wait()
+    finally:
+        await webhook_server.stop()
+        if application.running:
+            await application.stop()
+        await on_shutdown(application)
+        await application.shutdown()
 
 def main() -> None:
     """Start the bot."""
     if not TELEGRAM_TOKEN:
         logger.error("TELEGRAM_TOKEN not found in .env file")
         return
+    if UPDATE_MODE == 'webhook' and not WEBHOOK_URL and not WEBHOOK_SECRET:
+        # A generated secret is only known to Telegram if this process registers the webhook.
+        logger.error("UPDATE_MODE=webhook needs WEBHOOK_URL, or the WEBHOOK_SECRET the webhook was registered with")
+        return
 
     job_queue = JobQueue()
-    application = Application.builder().token(TELEGRAM_TOKEN).job_queue(job_queue).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .job_queue(job_queue)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler('signal', signal_command))
     application.add_handler(CommandHandler("history", history))
+    application.add_handler(CommandHandler("stats", stats))
     application.add_handler(CallbackQueryHandler(button))
 
-    job_queue.run_repeating(proactive_signals, interval=900, first=10)
-    job_queue.run_repeating(monitor_pending_signals, interval=60) # Monitor every 60 seconds
+    job_queue.run_repeating(proactive_signals, interval=PROACTIVE_INTERVAL, first=10)
+    job_queue.run_repeating(monitor_pending_signals, interval=60) # Poll every 60 seconds (fallback in stream mode)
 
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if UPDATE_MODE == 'webhook':
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
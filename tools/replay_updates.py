@@ -0,0 +1,76 @@
+"""
+Posts recorded Telegram updates to the bot's webhook endpoint, the way
+Telegram would, and reports the response codes and how quickly each update
+was accepted.
+
+Each line of the replay file is one raw update as Telegram sends it, e.g.
+{"update_id": 1, "message": {"message_id": 1, "date": 1700000000, "chat": {"id": 42, "type": "private"},
+ "from": {"id": 42, "is_bot": false, "first_name": "A"}, "text": "/signal BTC/USDT",
+ "entities": [{"type": "bot_command", "offset": 0, "length": 7}]}}
+
+Start the bot with UPDATE_MODE=webhook and WEBHOOK_SECRET set (and no
+WEBHOOK_URL, so nothing is registered with Telegram), then:
+
+    python tools/replay_updates.py updates.jsonl --secret "$WEBHOOK_SECRET" --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+
+import aiohttp
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def load_updates(path, repeat):
+    with open(path) as f:
+        updates = [json.loads(line) for line in f if line.strip()]
+    # Fresh update ids per repetition, as Telegram would never resend one after a 200.
+    return [{**update, "update_id": update["update_id"] + i * 1_000_000} for i in range(repeat) for update in updates]
+
+async def replay(url, updates, secret, concurrency, interval):
+    statuses, latencies = Counter(), []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession() as session:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json=update, headers={SECRET_HEADER: secret}) as response:
+                        statuses[response.status] += 1
+                except aiohttp.ClientError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        tasks = []
+        for update in updates:
+            tasks.append(asyncio.create_task(post(update)))
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+
+    latencies.sort()
+    return {
+        "updates": len(updates),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "ack_ms_p50": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "ack_ms_max": round(latencies[-1] * 1000, 2) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("replay_file", help="JSON-lines file of recorded Telegram updates")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default="", help="Value for the X-Telegram-Bot-Api-Secret-Token header")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Send the file this many times")
+    parser.add_argument("--interval", type=float, default=0.0, help="Seconds between sends")
+    args = parser.parse_args()
+    updates = load_updates(args.replay_file, args.repeat)
+    print(json.dumps(asyncio.run(replay(args.url, updates, args.secret, args.concurrency, args.interval)), indent=2))
+
+if __name__ == "__main__":
+    main()
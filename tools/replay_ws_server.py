@@ -0,0 +1,75 @@
+"""
+Local fake of the Binance combined-stream WebSocket that replays recorded ticks.
+
+Each line of the replay file is one raw stream message, e.g.
+{"stream": "btcusdt@miniTicker", "data": {"e": "24hrMiniTicker", "s": "BTCUSDT", "c": "64000.1"}}
+
+Point the bot at it with BINANCE_WS_URL=ws://127.0.0.1:8765/stream and PRICE_FEED=stream.
+Use --drop-after to close the connection mid-replay and exercise reconnects;
+the replay position is kept across connections, so each reconnect resumes
+where the previous one was dropped.
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from aiohttp import web, WSMsgType
+
+logger = logging.getLogger(__name__)
+
+def load_ticks(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+async def stream_handler(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    ticks = request.app['ticks']
+    interval = request.app['interval']
+    drop_after = request.app['drop_after']
+
+    async def ack_subscriptions():
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                request_id = json.loads(msg.data).get("id")
+                await ws.send_str(json.dumps({"result": None, "id": request_id}))
+
+    reader = asyncio.create_task(ack_subscriptions())
+    sent = 0
+    try:
+        while request.app['position'] < len(ticks):
+            await ws.send_str(ticks[request.app['position']])
+            request.app['position'] += 1
+            sent += 1
+            if drop_after and sent >= drop_after:
+                logger.info(f"Dropping connection after {sent} ticks, at {request.app['position']}/{len(ticks)}.")
+                break
+            await asyncio.sleep(interval)
+        else:
+            logger.info(f"Replay finished after {len(ticks)} ticks.")
+    finally:
+        reader.cancel()
+        await ws.close()
+    return ws
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("ticks", help="JSON-lines file of recorded stream messages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between replayed messages")
+    parser.add_argument("--drop-after", type=int, default=0, help="Close each connection after N messages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = web.Application()
+    app['ticks'] = load_ticks(args.ticks)
+    app['interval'] = args.interval
+    app['drop_after'] = args.drop_after
+    app['position'] = 0 # Next tick to send, shared by successive connections
+    app.router.add_get("/stream", stream_handler)
+    web.run_app(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
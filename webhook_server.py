@@ -0,0 +1,121 @@
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+
+from aiohttp import web
+from dotenv import load_dotenv
+from telegram import Update
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") # Public URL registered with Telegram; unset leaves registration to someone else
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") # Unset generates one per run; then WEBHOOK_URL must be set so it gets registered
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "32")) # Updates handled at the same time
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000")) # Accepted but unfinished updates before answering 503
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """
+    Receives Telegram updates on POST `path` and hands each one to
+    `application.process_update` in its own task, so a slow /signal never
+    holds up other users' updates. Telegram gets its 200 as soon as the
+    update is accepted. At most `max_concurrency` updates run at once; beyond
+    `max_pending` accepted updates the server answers 503 and Telegram
+    redelivers later. Requests without the secret token are refused.
+    """
+
+    def __init__(self, application, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                 max_concurrency=WEBHOOK_MAX_CONCURRENCY, max_pending=WEBHOOK_MAX_PENDING):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks = set()
+        self._runner = None
+        self.stats = {"received": 0, "processed": 0, "failed": 0, "rejected_secret": 0,
+                      "invalid": 0, "overloaded": 0, "waiting": 0, "in_flight": 0}
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Receiving Telegram updates on http://{self.host}:{self.port}{self.path}")
+
+    async def register(self, url, allowed_updates=Update.ALL_TYPES):
+        """Points Telegram at `url` with this server's secret token."""
+        await self.application.bot.set_webhook(url, allowed_updates=allowed_updates, secret_token=self.secret_token,
+                                               max_connections=min(100, self.max_concurrency))
+        logger.info(f"Registered webhook {url}")
+
+    async def stop(self, drain_timeout=10.0):
+        """Stops accepting updates and gives the accepted ones up to `drain_timeout` seconds to finish."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._tasks:
+            _, unfinished = await asyncio.wait(self._tasks, timeout=drain_timeout)
+            if unfinished:
+                logger.warning(f"Webhook stopped with {len(unfinished)} updates unfinished.")
+            for task in unfinished:
+                task.cancel()
+
+    def webhook_stats(self):
+        """Counters plus the number of accepted updates not yet finished."""
+        return {**self.stats, "pending": len(self._tasks)}
+
+    async def _handle_update(self, request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            self.stats["rejected_secret"] += 1
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            self.stats["invalid"] += 1
+            logger.warning(f"Ignoring malformed webhook update: {e}")
+            return web.Response(status=400)
+        if update is None:
+            self.stats["invalid"] += 1
+            return web.Response(status=400)
+        if len(self._tasks) >= self.max_pending:
+            self.stats["overloaded"] += 1
+            return web.Response(status=503)
+
+        self.stats["received"] += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update):
+        self.stats["waiting"] += 1
+        acquired = False
+        try:
+            async with self._semaphore:
+                acquired = True
+                self.stats["waiting"] -= 1
+                self.stats["in_flight"] += 1
+                try:
+                    await self.application.process_update(update)
+                    self.stats["processed"] += 1
+                except Exception as e:
+                    # process_update already routes handler errors to the error handlers; this catches the rest.
+                    self.stats["failed"] += 1
+                    logger.error(f"Failed to process update {update.update_id}: {e}")
+                finally:
+                    self.stats["in_flight"] -= 1
+        finally:
+            if not acquired: # Cancelled while waiting for a slot
+                self.stats["waiting"] -= 1
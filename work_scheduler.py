@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from metrics import COMPONENT_STATS, SCHEDULER_REJECTIONS, SCHEDULER_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first: a user's /signal, re-evaluating a pending trade whose entry was hit, market scans.
+PRIORITIES = ("interactive", "confirmation", "background")
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "4")) # Signal computations at once, all classes
+SCHEDULER_BACKGROUND_SLOTS = int(os.getenv("SCHEDULER_BACKGROUND_SLOTS", "2")) # Of those, at most this many for scans
+SCHEDULER_MAX_QUEUED = {
+    "interactive": int(os.getenv("SCHEDULER_MAX_INTERACTIVE", "50")),
+    "confirmation": int(os.getenv("SCHEDULER_MAX_CONFIRMATION", "200")),
+    "background": int(os.getenv("SCHEDULER_MAX_BACKGROUND", "10")),
+}
+SCHEDULER_MAX_PER_USER = int(os.getenv("SCHEDULER_MAX_PER_USER", "2")) # Waiting requests per user and class
+BUSY_ERROR = "The bot is busy right now, please try again in a minute."
+
+class SchedulerBusy(Exception):
+    """Raised by WorkScheduler.slot when admission control refuses a request."""
+
+    def __init__(self, message=BUSY_ERROR):
+        super().__init__(message)
+
+class WorkScheduler:
+    """
+    Hands out a fixed number of slots for LLM-bound work. Waiting requests
+    are served strictly by priority class, and within a class round-robin
+    across users, so one user queueing several requests cannot starve the
+    others. Background work never holds more than `background_slots` slots,
+    keeping room for interactive requests during a scan. A request is
+    refused with SchedulerBusy when its class queue, or the user's share of
+    it, is full.
+    """
+
+    def __init__(self, concurrency=SCHEDULER_CONCURRENCY, background_slots=SCHEDULER_BACKGROUND_SLOTS,
+                 max_queued=SCHEDULER_MAX_QUEUED, max_per_user=SCHEDULER_MAX_PER_USER):
+        self.concurrency = concurrency
+        self.background_slots = background_slots
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES} # user -> deque of waiting futures
+        self._queued = dict.fromkeys(PRIORITIES, 0)
+        self._running = dict.fromkeys(PRIORITIES, 0)
+
+    @asynccontextmanager
+    async def slot(self, priority, user=None):
+        """Waits for a slot in `priority`'s turn and holds it for the block."""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority {priority!r}")
+        waiting = self._queues[priority].get(user, ())
+        if self._queued[priority] >= self.max_queued[priority] or (user is not None and len(waiting) >= self.max_per_user):
+            SCHEDULER_REJECTIONS.inc(priority=priority)
+            logger.info(f"Refused {priority} work for {user}: {self._queued[priority]} queued.")
+            raise SchedulerBusy()
+
+        started = time.monotonic()
+        granted = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user, deque()).append(granted)
+        self._queued[priority] += 1
+        self._dispatch()
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                self._release(priority) # Granted just as the caller gave up
+            else:
+                self._forget(priority, user, granted)
+            raise
+        SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - started, priority=priority)
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def _release(self, priority):
+        self._running[priority] -= 1
+        self._dispatch()
+
+    def _forget(self, priority, user, granted):
+        waiting = self._queues[priority].get(user)
+        if waiting is not None and granted in waiting:
+            waiting.remove(granted)
+            self._queued[priority] -= 1
+            if not waiting:
+                del self._queues[priority][user]
+
+    def _dispatch(self):
+        while sum(self._running.values()) < self.concurrency:
+            for priority in PRIORITIES:
+                if priority == "background" and self._running[priority] >= self.background_slots:
+                    continue
+                granted = self._next_waiter(priority)
+                if granted is not None:
+                    granted.set_result(None)
+                    self._running[priority] += 1
+                    break
+            else:
+                return
+
+    def _next_waiter(self, priority):
+        # Takes the oldest request of the user at the front, then moves that user to the back.
+        # Waiters cancelled since they queued are dropped here; their own cleanup has not run yet.
+        queue = self._queues[priority]
+        while queue:
+            user, waiting = next(iter(queue.items()))
+            granted = waiting.popleft()
+            if waiting:
+                queue.move_to_end(user)
+            else:
+                del queue[user]
+            self._queued[priority] -= 1
+            if not granted.done():
+                return granted
+        return None
+
+    def scheduler_stats(self):
+        """Waiting and running requests per class."""
+        stats = {}
+        for priority in PRIORITIES:
+            stats[f"{priority}_queued"] = self._queued[priority]
+            stats[f"{priority}_running"] = self._running[priority]
+        return stats
+
+work_scheduler = WorkScheduler()
+COMPONENT_STATS.add_source("scheduler", work_scheduler.scheduler_stats)